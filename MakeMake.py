@@ -1,12 +1,27 @@
 from pathlib import Path
+import concurrent.futures
+import contextlib
+import copy
+import fnmatch
+import glob
+import hashlib
+import io
 import json
-
-from pprint import pprint
-
+import multiprocessing
+import re
+import shlex
 import shutil
+import subprocess
 import sys
+import threading
+import time
 import os
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 
 class Logger:
     silent: bool = False
@@ -39,51 +54,519 @@ class Logger:
             sys.exit(code)
 
 
+STATE_DIR: Path = Path(".MakeMake")
+# the profiles of the instrumented and of the optimized stage of profile-guided optimization
+PGO_PROFILES: tuple[str, str] = ("pgo-instrument", "pgo-optimize")
+# a reference to a global: `$(<global-name>)`
+GLOBAL_REFERENCE: re.Pattern = re.compile(r"\$\(([^()$\s]+)\)")
+
+
+class Timings:
+    """
+    Measures how long MakeMake spends in every phase when `--timings` is given.
+    A phase is charged only for its own time, the phases that it runs are charged for theirs
+    """
+    enabled: bool = False
+    start: float = 0.0
+    seconds: dict[str, float] = {}
+    calls: dict[str, int] = {}
+    # the phases that are running right now together with the time that the phases they ran took
+    stack: list[list] = []
+
+    @classmethod
+    def enable(cls) -> None:
+        cls.enabled = True
+        cls.start = time.perf_counter()
+
+    @classmethod
+    def reset(cls) -> None:
+        cls.enabled = False
+        cls.seconds.clear()
+        cls.calls.clear()
+        cls.stack.clear()
+
+    @classmethod
+    @contextlib.contextmanager
+    def phase(cls, name: str):
+        if not cls.enabled:
+            yield
+            return
+        cls.calls[name] = cls.calls.get(name, 0) + 1
+        # a phase that runs itself again (nested lists of globals) is timed once
+        if len(cls.stack) > 0 and cls.stack[-1][0] == name:
+            yield
+            return
+        cls.stack.append([name, 0.0])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            _, children = cls.stack.pop()
+            if len(cls.stack) > 0:
+                cls.stack[-1][1] += elapsed
+            cls.seconds[name] = cls.seconds.get(name, 0.0) + elapsed - children
+
+    @classmethod
+    def timed(cls, name: str):
+        """
+        Decorates a function so that every call of it is charged to the phase `name`
+        """
+        def decorator(function):
+            def wrapper(*args, **kwargs):
+                if not cls.enabled:
+                    return function(*args, **kwargs)
+                with cls.phase(name):
+                    return function(*args, **kwargs)
+            wrapper.__name__ = function.__name__
+            wrapper.__doc__ = function.__doc__
+            wrapper.__wrapped__ = function
+            return wrapper
+        return decorator
+
+    @classmethod
+    def print_report(cls) -> None:
+        if not cls.enabled:
+            return
+        total = time.perf_counter() - cls.start
+        phases = sorted(cls.seconds.items(), key=lambda phase: phase[1], reverse=True)
+        phases.append(("other", max(0.0, total - sum(cls.seconds.values()))))
+        print("[TIMINGS]", file=sys.stderr)
+        for name, seconds in phases:
+            print(f"    {name:20} {seconds * 1000:10.2f}ms {seconds / total if total > 0 else 0:7.1%}", file=sys.stderr)
+        print(f"    {'total':20} {total * 1000:10.2f}ms", file=sys.stderr)
+
+
+class Stamp:
+    """
+    Remembers what the last successful run of MakeMake consumed and produced so that an unchanged tree
+    can be detected without parsing a single config file
+    """
+    def __init__(self, path: os.PathLike=STATE_DIR / "stamp.json") -> None:
+        self.path: Path = Path(path)
+        self.data: dict = {}
+
+    @staticmethod
+    def hash_file(path: os.PathLike) -> str | None:
+        try:
+            with open(path, "rb") as f:
+                return hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return None
+
+    @staticmethod
+    def generator_version() -> str:
+        return Stamp.hash_file(__file__) or ""
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "r") as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+
+    def is_up_to_date(self, config_path: os.PathLike, options: list[str]) -> bool:
+        """
+        Checks if the files that were generated in the last run are still valid
+
+        :param config_path: the path of the top level config file
+        :param options: the command line options that affect the generated files
+        :return: True if every config file of the tree is unchanged and every generated file still exists
+        """
+        if not self.data:
+            return False
+        if self.data.get("version") != self.generator_version():
+            return False
+        if self.data.get("config") != str(config_path) or self.data.get("options") != options:
+            return False
+        for path, digest in self.data.get("configs", {}).items():
+            if self.hash_file(path) != digest:
+                return False
+        for path in self.data.get("outputs", []):
+            if not os.path.exists(path):
+                return False
+        for directory, mtime in self.data.get("directories", {}).items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        for unity in self.data.get("unity", {}).values():
+            if self.unity_batches(unity) != unity["batches"]:
+                return False
+        return True
+
+    @staticmethod
+    def unity_batches(unity: dict) -> list[list[str]]:
+        """
+        Groups the recorded members of the unity batches again, `max-bytes` makes the groups depend on the current sizes of the sources
+
+        :param unity: the unity build of a config file as it was recorded
+        """
+        sources = [source for batch in unity["batches"] for source in batch]
+        batches: list[list[str]] = []
+        for extension in (".cpp", ".c"):
+            batches += ConfigFile.group_unity_batches([source for source in sources if source.endswith(extension)],
+                                                      unity["batch-size"], unity["max-bytes"])
+        return batches
+
+    def record(self, config_file: "ConfigFile", options: list[str], outputs: list[Path]) -> None:
+        """
+        Records what `is_up_to_date` checks, the globals are left out because they only come from the config files
+        whose hashes are compared already
+        """
+        configs: dict[str, str] = {}
+        directories: dict[str, int] = {}
+        unity: dict[str, dict] = {}
+        for cfg_file in config_file.topological_order():
+            configs[str(cfg_file.path)] = self.hash_file(cfg_file.path)
+            directories.update(cfg_file.scanned_directories)
+            unity_build = cfg_file.cxx.get("unity-build", None)
+            if unity_build is not None and unity_build.get("max-bytes", None) is not None:
+                unity[str(cfg_file.path)] = {
+                    "batch-size": unity_build.get("batch-size", None),
+                    "max-bytes": unity_build["max-bytes"],
+                    "batches": list(cfg_file.unity_batches().values()),
+                }
+
+        self.data = {
+            "version": self.generator_version(),
+            "config": str(config_file.path),
+            "options": options,
+            "configs": configs,
+            "outputs": [str(output) for output in outputs],
+            "directories": directories,
+            "unity": unity,
+        }
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        ConfigFile.write_file(self.path, json.dumps(self.data, indent=2, default=str))
+
+
+class SourceIndex:
+    """
+    A cached listing of the source directories. A directory is only read again with `os.scandir`
+    when its mtime changed, so discovering the sources of a large unchanged tree costs one `stat` per directory
+    """
+    def __init__(self, path: os.PathLike=STATE_DIR / "index.json") -> None:
+        self.path: Path = Path(path)
+        self.directories: dict[str, dict] = {}
+        self.dirty: bool = False
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "r") as f:
+                self.directories = json.load(f)
+        except (OSError, ValueError):
+            self.directories = {}
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        ConfigFile.write_file(self.path, json.dumps(self.directories))
+        self.dirty = False
+
+    def list_directory(self, directory: str) -> dict | None:
+        """
+        :return: the mtime, the files and the subdirectories of `directory` or None if it does not exist
+        """
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+
+        entry = self.directories.get(directory, None)
+        if entry is not None and entry["mtime"] == mtime:
+            return entry
+
+        files: list[str] = []
+        directories: list[str] = []
+        with os.scandir(directory) as entries:
+            for dir_entry in entries:
+                if dir_entry.is_dir(follow_symlinks=False):
+                    directories.append(dir_entry.name)
+                elif dir_entry.is_file():
+                    files.append(dir_entry.name)
+
+        entry = {"mtime": mtime, "files": sorted(files), "directories": sorted(directories)}
+        self.directories[directory] = entry
+        self.dirty = True
+
+        return entry
+
+    def walk(self, root: str) -> tuple[list[str], dict[str, int]]:
+        """
+        :param root: the directory to walk recursively
+        :return: every file below `root` relative to it and the mtime of every directory that was visited
+        """
+        files: list[str] = []
+        mtimes: dict[str, int] = {}
+
+        pending: list[str] = [os.path.normpath(root)]
+        while len(pending) > 0:
+            directory = pending.pop()
+            entry = self.list_directory(directory)
+            if entry is None:
+                continue
+            mtimes[directory] = entry["mtime"]
+            relative = os.path.relpath(directory, root)
+            for name in entry["files"]:
+                files.append(name if relative == "." else f"{relative}/{name}")
+            for name in entry["directories"]:
+                pending.append(os.path.join(directory, name))
+
+        return sorted(files), mtimes
+
+
+class NinjaWriter:
+    """
+    Writes a `build.ninja` statement by statement into an in memory buffer,
+    the whole file is written at once when it is done
+    """
+    def __init__(self) -> None:
+        self.buffer: io.StringIO = io.StringIO()
+
+    @staticmethod
+    def escape(text: str) -> str:
+        return text.replace("$", "$$")
+
+    @staticmethod
+    def escape_path(path: os.PathLike) -> str:
+        return str(path).replace("$", "$$").replace(" ", "$ ").replace(":", "$:")
+
+    def comment(self, text: str) -> None:
+        self.buffer.write(f"# {text}\n")
+
+    def newline(self) -> None:
+        self.buffer.write("\n")
+
+    def variable(self, key: str, value: str, indent: int=0) -> None:
+        self.buffer.write(f"{'  ' * indent}{key} = {value}\n")
+
+    def pool(self, name: str, depth: int) -> None:
+        self.buffer.write(f"pool {name}\n")
+        self.variable("depth", str(depth), 1)
+
+    def rule(self, name: str, **variables: str) -> None:
+        self.buffer.write(f"rule {name}\n")
+        for key, value in variables.items():
+            self.variable(key, value, 1)
+
+    def build(self, outputs: list[os.PathLike], rule: str, inputs: list[os.PathLike]=(), implicit: list[os.PathLike]=(),
+              order_only: list[os.PathLike]=(), variables: dict[str, str] | None=None) -> None:
+        self.buffer.write(f"build {' '.join(self.escape_path(output) for output in outputs)}: {rule}")
+        for path in inputs:
+            self.buffer.write(f" {self.escape_path(path)}")
+        if len(implicit) > 0:
+            self.buffer.write(f" | {' '.join(self.escape_path(path) for path in implicit)}")
+        if len(order_only) > 0:
+            self.buffer.write(f" || {' '.join(self.escape_path(path) for path in order_only)}")
+        self.buffer.write("\n")
+        for key, value in (variables or {}).items():
+            self.variable(key, value, 1)
+
+    def getvalue(self) -> str:
+        return self.buffer.getvalue()
+
+
+class Target:
+    """
+    An executable of a config file. It links the objects of the shared `source-files` of the config file
+    together with the objects of its own source files
+    """
+    def __init__(self, label: str | None, name: str, source_files: list[str] | None=None, libraries: list[str] | None=None,
+                 library_directories: list[str] | None=None) -> None:
+        # the key of the target in the `targets` section, None for the target of the `executable` section
+        self.label: str | None = label
+        self.name: str = name
+        self.source_files: list[str] = source_files or []
+        self.libraries: list[str] = libraries or []
+        self.library_directories: list[str] = library_directories or []
+
+    @property
+    def variable(self) -> str:
+        if self.label is None:
+            return "EXECUTABLE"
+        return re.sub(r"[^A-Za-z0-9]", "_", self.label).upper()
+
+    @property
+    def description(self) -> str:
+        return "the `executable` section" if self.label is None else f"target `{self.label}`"
+
+    def link_arguments(self) -> list[str]:
+        return [f"-L{directory}" for directory in self.library_directories] + [f"-l{library}" for library in self.libraries]
+
+
 class ConfigFile:
+    # config files that were already parsed keyed by their resolved path and the globals they were given,
+    # a dependency that many config files share is parsed only once
+    parsed: dict[tuple[str, str], "ConfigFile"] = {}
+    # resolved paths of the config files that are being parsed right now, used to detect dependency cycles
+    parsing: list[str] = []
+    # generate Makefiles that are correct under `make -j`: order-only directory prerequisites,
+    # a build tree that mirrors the source tree and `$(MAKE)` for sub-makes
+    parallel_safe: bool = False
+    # shared by every config file so a directory that many of them discover is listed once
+    source_index: SourceIndex | None = None
+    # the directory level that separates the outputs of the build profiles, the Makefiles select it at make time
+    profile: str = "$(PROFILE)$(UNITY_SUFFIX)"
+
     def __init__(self, path: os.PathLike) -> None:
         self.path = path
         self.data: dict
 
+        # the resolved value of every global that was used so far
         self.globals: dict[str, str] = {}
+        # the value of every global as it was defined together with the section that defined it
+        self.global_definitions: dict[str, tuple[str | dict | list, str]] = {}
+        # the globals whose resolved value used every global, defined or not
+        self.global_dependents: dict[str, set[str]] = {}
+        self.undefined_globals: set[tuple[str, str]] = set()
         self.cxx: dict[str, str] = {}
         self.settings: dict[str, str] = {}
+        self.profiles: dict[str, str] = {}
+        self.default_profile: str = "debug"
         self.executable_name: str = ""
+        # the executables of an `executable` config file, from the `executable` and the `targets` sections
+        self.targets: list[Target] = []
         self.archive_name: str = ""
+        # a thin archive references its object files instead of holding copies of them
+        self.thin_archive: bool = False
+        self.shared_name: str = ""
+        # how the config file that depends on this one links it, `static` or `shared` override `settings.out-type`
+        self.link: str | None = None
+        # objects are compiled with `-fPIC` for shared libraries and for the archives that are linked into them
+        self.position_independent: bool = False
+        # the profiles that are compiled, archived and linked with link time optimization
+        self.lto_profiles: list[str] = []
+        # the profile that the PGO stages are built on and the commands that train the instrumented stage,
+        # the dependencies inherit the stages but only the config file with the `cxx.pgo` section trains them
+        self.pgo_profile: str | None = None
+        self.pgo_training: list[str] | None = None
         self.source_files: list[str] = []
         self.libraries: list[str] = []
         self.include_directories: list[str] = []
         self.library_directories: list[str] = []
         self.directories_to_create: list[str] = []
 
+        # the dependencies as they were parsed, shared with every other config file that uses them
+        self.parsed_dependencies: dict[str, ConfigFile] = {}
+        # the dependencies of this config file tree, copies of the parsed ones with the settings they inherit
         self.dependencies_config_files: dict[str, ConfigFile] = {}
+        # the parsed config file that this one is a copy of, itself when it is not a copy
+        self.base: ConfigFile = self
+
+        # mtime of every directory that `source-discovery` visited, used to tell if the discovered files changed
+        self.scanned_directories: dict[str, int] = {}
 
         self.logger: Logger = Logger(self.path)
 
-    def add_global(self, key: str, value: str) -> None:
-        self.globals[key] = self.apply_globals(value)
+    def add_global(self, key: str, value: str, section: str="globals") -> None:
+        if self.global_definitions.get(key, None) == (value, section):
+            return
+        self.global_definitions[key] = (value, section)
+        self.invalidate_global(key)
+
+    def invalidate_global(self, name: str) -> None:
+        """
+        Drops the resolved value of `name` and of every global that used it, the other resolved values stay memoized
+        """
+        pending = [name]
+        while len(pending) > 0:
+            name = pending.pop()
+            self.globals.pop(name, None)
+            pending += self.global_dependents.pop(name, set())
+
+    def resolve_global(self, name: str, chain: list[str] | None=None) -> str | dict | list | None:
+        """
+        Resolves a global and every global that it references, resolved values are memoized
+
+        :param name: the name of the global
+        :param chain: the globals that are being resolved right now, used to detect reference cycles
+        :return: the resolved value or None if the global is not defined
+        """
+        if name in self.globals:
+            return self.globals[name]
+        if name not in self.global_definitions:
+            return None
+
+        chain = [] if chain is None else chain
+        value, section = self.global_definitions[name]
+        if name in chain:
+            cycle = chain[chain.index(name):] + [name]
+            self.logger.error(f"globals reference each other in a cycle in section `{section}`: {' -> '.join(f'$({global_name})' for global_name in cycle)}")
+
+        if isinstance(value, str):
+            value = self.substitute_globals(value, section, chain + [name])
+        self.globals[name] = value
 
-    def apply_globals(self, target: str | dict | list | None, category="") -> str | dict | list:
+        return value
+
+    def substitute_globals(self, text: str, section: str, chain: list[str]) -> str:
+        """
+        Replaces every `$(<global-name>)` in `text` in a single pass, references to undefined globals are left as they are.
+        Only an undefined `$(<section-name>.<name>)` is reported, any other name may be a make variable like `$(PROFILE)` or `$(CC)`
+        """
+        def replace(match: re.Match) -> str:
+            name = match.group(1)
+            if len(chain) > 0:
+                self.global_dependents.setdefault(name, set()).add(chain[-1])
+            value = self.resolve_global(name, chain)
+            if isinstance(value, str):
+                return value
+            if value is None and "." in name and (name, section) not in self.undefined_globals:
+                self.undefined_globals.add((name, section))
+                self.logger.warn(f"undefined global `$({name})` in section `{section}` is left as it is")
+            return match.group(0)
+
+        if "$(" not in text:
+            return text
+        return GLOBAL_REFERENCE.sub(replace, text)
+
+    @Timings.timed("resolve globals")
+    def resolved_globals(self) -> dict[str, str | dict | list]:
+        for name in self.global_definitions:
+            self.resolve_global(name)
+        return dict(self.globals)
+
+    def register_section_globals(self) -> None:
+        """
+        Defines the `<section-name>.<name>` globals of every section before any of them is resolved,
+        so a reference does not depend on the order in which the sections are parsed
         """
-        Applies the globals gathered till this point
+        for section in ("settings", "executable", "archive", "shared", "cxx"):
+            if not isinstance(self.data.get(section, None), dict):
+                continue
+            for key, value in self.data[section].items():
+                if isinstance(key, str) and isinstance(value, str):
+                    self.add_global(f"{section}.{key}", value, section)
+
+    @Timings.timed("resolve globals")
+    def apply_globals(self, target: str | dict | list | None, category="", section="") -> str | dict | list:
+        """
+        Applies the globals to every string of `target`
 
         :param target: that object that the function will act upon. It can be a string, a dict or a list
         :param category: an optional parameter that effects this function only when a dictonary is passed
+        :param section: the section that `target` comes from, used to report undefined globals
         :return: the modified object
         """
+        section = section or category
         if isinstance(target, str):
-            for key, value in self.globals.items():
-                if isinstance(value, str):
-                    target = target.replace(f"$({key})", value)
-            return target
+            return self.substitute_globals(target, section, [])
         elif isinstance(target, dict):
             for key, value in target.items():
-                target[key] = self.apply_globals(value)
+                target[key] = self.apply_globals(value, section=section)
                 if category != "":
-                    self.add_global(f"{category}.{key}", value)
+                    self.add_global(f"{category}.{key}", value, category)
             return target
         elif isinstance(target, list):
             for key, value in enumerate(target):
-                target[key] = self.apply_globals(value)
+                target[key] = self.apply_globals(value, section=section)
+            return target
+        elif isinstance(target, (bool, int, float)):
             return target
         else:
             raise RuntimeError(f"Unknown type {type(target)}")
@@ -102,9 +585,15 @@ class ConfigFile:
             self.add_global(key, value)
 
     def parse_executable(self) -> None:
-        if self.data.get("executable", None) is None:
-            self.logger.error("No `executable` section in config file")
+        if self.data.get("executable", None) is None and self.data.get("targets", None) is None:
+            self.logger.error("No `executable` or `targets` section in config file")
+
+        if self.data.get("executable", None) is not None:
+            self.parse_executable_section()
+        if self.data.get("targets", None) is not None:
+            self.parse_targets()
 
+    def parse_executable_section(self) -> None:
         if not isinstance(self.data["executable"], dict):
             self.logger.error("`executable` section must be a object that contains *only* strings")
 
@@ -114,26 +603,140 @@ class ConfigFile:
         if not isinstance(self.data["executable"]["name"], str):
             self.logger.error("`name` field in `executable` section must be a string")
 
-        self.executable_name = self.apply_globals(self.data["executable"]["name"])
+        source_files = self.data["executable"].get("source-files", [])
+        if not isinstance(source_files, list) or not all(isinstance(source, str) for source in source_files):
+            self.logger.error("`source-files` field in `executable` section must be a array of strings")
+
+        self.executable_name = self.apply_globals(self.data["executable"]["name"], section="executable")
+
+        self.add_global("executable.name", self.executable_name, "executable")
+
+        self.targets.append(Target(None, self.executable_name, self.apply_globals(list(source_files), section="executable")))
+
+    def parse_targets(self) -> None:
+        """
+        Every target of the `targets` section is an executable with its own source files and link inputs.
+        The targets share the compile flags of the config file, so a source file is compiled once
+        however many targets link its object
+        """
+        if not isinstance(self.data["targets"], dict):
+            self.logger.error("`targets` section must be a object that holds a object for every target")
+
+        for label, data in self.data["targets"].items():
+            if re.fullmatch(r"[A-Za-z0-9_-]+", label) is None:
+                self.logger.error(f"target name `{label}` may only contain letters, digits, `-` and `_`")
+            if label in ("all", "clean"):
+                self.logger.error(f"`{label}` can not be the name of a target, make already uses it")
+            if not isinstance(data, dict):
+                self.logger.error(f"target `{label}` in `targets` section must be a object")
+            if not isinstance(data.get("name", None), str):
+                self.logger.error(f"target `{label}` in `targets` section needs a `name` string")
+            for field in ("source-files", "libraries", "library-dirs"):
+                value = data.get(field, [])
+                if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+                    self.logger.error(f"`{field}` field of target `{label}` must be a array of strings")
+
+            name = self.apply_globals(data["name"], section="targets")
+            self.add_global(f"targets.{label}.name", name, "targets")
+
+            self.targets.append(Target(
+                label, name,
+                self.apply_globals(list(data.get("source-files", [])), section="targets"),
+                self.apply_globals(list(data.get("libraries", [])), section="targets"),
+                self.apply_globals(list(data.get("library-dirs", [])), section="targets"),
+            ))
+
+        variables: dict[str, Target] = {}
+        names: set[str] = set()
+        for target in self.targets:
+            if target.name in names:
+                self.logger.error(f"more than one target is named `{target.name}`")
+            names.add(target.name)
+            if target.variable in variables:
+                self.logger.error(f"{variables[target.variable].description} and {target.description} need different names")
+            variables[target.variable] = target
+
+    def check_target_source_files(self) -> None:
+        """
+        The object rules are pattern rules that find the source file of an object in `src-c-dir` or `src-cpp-dir`,
+        directly in it or with --parallel-safe anywhere below it, a source file that only a target lists has no other rule
+        """
+        for target in self.targets:
+            for source in target.source_files:
+                source_dir = self.settings["src-c-dir"] if source.endswith(".c") else self.settings["src-cpp-dir"]
+                stem = os.path.relpath(source, source_dir) if ConfigFile.parallel_safe else Path(source).name
+                if stem.startswith("..") or os.path.normpath(os.path.join(source_dir, stem)) != os.path.normpath(source):
+                    where = "inside" if ConfigFile.parallel_safe else "directly in"
+                    self.logger.error(f"`{source}` of {target.description} is not {where} `{source_dir}`, "
+                                      "the object rules only find the source files there")
+
+    def check_object_files(self) -> None:
+        """
+        The object file of a source file is named after the source file, two source files that targets share
+        must not end up in the same object file
+        """
+        objects: dict[Path, str] = {}
+        for source in self.all_source_files():
+            object_file = self.object_file(source)
+            if object_file in objects and os.path.normpath(objects[object_file]) != os.path.normpath(source):
+                self.logger.error(f"`{objects[object_file]}` and `{source}` are both compiled to `{object_file}`, --parallel-safe keeps them apart")
+            objects[object_file] = source
+
+    def library_section(self, section: str) -> str:
+        """
+        A dependency that is linked differently than its `settings.out-type` (`link` in the `dependencies` section)
+        takes the name of the library from the section of its own out-type
 
-        self.add_global("executable.name", self.executable_name)
+        :param section: the section of the out-type that is built, `archive` or `shared`
+        :return: `section` or the other library section when only that one exists
+        """
+        if self.data.get(section, None) is None and self.link is not None:
+            other = "shared" if section == "archive" else "archive"
+            if self.data.get(other, None) is not None:
+                return other
+        return section
 
     def parse_archive(self) -> None:
-        if self.data.get("archive", None) is None:
+        section = self.library_section("archive")
+        if self.data.get(section, None) is None:
             self.logger.error("No `archive` section in config file")
 
-        if not isinstance(self.data["archive"], dict):
-            self.logger.error("`archive` section must be a object that contains *only* strings")
+        if not isinstance(self.data[section], dict):
+            self.logger.error(f"`{section}` section must be a object")
 
-        if self.data["archive"].get("name", None) is None:
-            self.logger.error("no `name` found in archive section")
+        if self.data[section].get("name", None) is None:
+            self.logger.error(f"no `name` found in {section} section")
 
-        if not isinstance(self.data["archive"]["name"], str):
-            self.logger.error("`name` field in `archive` section must be a string")
+        if not isinstance(self.data[section]["name"], str):
+            self.logger.error(f"`name` field in `{section}` section must be a string")
 
-        self.archive_name = self.apply_globals(self.data["archive"]["name"])
+        self.archive_name = self.apply_globals(self.data[section]["name"], section=section)
 
-        self.add_global("archive.name", self.archive_name)
+        self.add_global("archive.name", self.archive_name, section)
+
+        self.thin_archive = self.data[section].get("thin", False)
+        if not isinstance(self.thin_archive, bool):
+            self.logger.error(f"`thin` field in `{section}` section must be a boolean")
+
+    def parse_shared(self) -> None:
+        section = self.library_section("shared")
+        if self.data.get(section, None) is None:
+            self.logger.error("No `shared` section in config file")
+
+        if not isinstance(self.data[section], dict):
+            self.logger.error(f"`{section}` section must be a object")
+
+        if self.data[section].get("name", None) is None:
+            self.logger.error(f"no `name` found in {section} section")
+
+        if not isinstance(self.data[section]["name"], str):
+            self.logger.error(f"`name` field in `{section}` section must be a string")
+
+        self.shared_name = self.apply_globals(self.data[section]["name"], section=section)
+
+        self.add_global("shared.name", self.shared_name, section)
+
+        self.position_independent = True
 
     def parse_cxx(self) -> None:
         if self.data.get("cxx", None) is None:
@@ -171,12 +774,259 @@ class ConfigFile:
         for flag in self.cxx["flags"]:
             if not isinstance(flag, str):
                 self.logger.error("`flags` field in `cxx` section must be a array of strings")
+        if self.cxx.get("precompiled-header", None) is not None and not isinstance(self.cxx["precompiled-header"], str):
+            self.logger.error("`precompiled-header` field in `cxx` section must be a string")
+        if self.cxx.get("unity-build", None) is not None:
+            self.parse_unity_build()
+        if self.cxx.get("compile-cache", None) is not None:
+            self.parse_compile_cache()
+        if self.cxx.get("lto", None) is not None:
+            self.parse_lto()
+        if self.cxx.get("pgo", None) is not None:
+            self.parse_pgo()
 
         self.cxx["flags"] = " ".join(self.cxx["flags"])
 
-
         self.apply_globals(self.cxx, "cxx")
 
+        self.parse_profiles()
+
+        if self.cxx.get("pgo", None) is not None:
+            self.pgo_training = self.cxx["pgo"]["training"]
+            self.add_pgo_profiles(self.cxx["pgo"]["profile"])
+        if self.cxx.get("lto", None) is not None:
+            lto = list(self.profiles) if self.cxx["lto"] is True else self.cxx["lto"]
+            for name in lto:
+                if name not in self.profiles:
+                    self.logger.error(f"`lto` field in `cxx` section names the unknown profile `{name}`")
+            self.add_lto(lto)
+
+    def parse_lto(self) -> None:
+        lto = self.cxx["lto"]
+        if isinstance(lto, bool):
+            self.cxx["lto"] = True if lto else []
+            return
+        if not isinstance(lto, list) or not all(isinstance(profile, str) for profile in lto):
+            self.logger.error("`lto` field in `cxx` section must be a boolean or a array with the names of profiles")
+
+    def parse_pgo(self) -> None:
+        pgo = self.cxx["pgo"]
+        if not isinstance(pgo, dict):
+            self.logger.error("`pgo` field in `cxx` section must be a object")
+
+        pgo["profile"] = pgo.get("profile", "release")
+        if not isinstance(pgo["profile"], str):
+            self.logger.error("`profile` field in `cxx.pgo` must be a string")
+
+        training = pgo.get("training", None)
+        if isinstance(training, str):
+            training = [training]
+        if not isinstance(training, list) or len(training) == 0 or not all(isinstance(command, str) for command in training):
+            self.logger.error("`training` field in `cxx.pgo` must be a command or a array of commands")
+        pgo["training"] = training
+
+        # the training commands run the instrumented executables
+        for target in self.targets:
+            name = "executable" if target.label is None else f"targets.{target.label}"
+            instrumented = Path(target.name).parent / PGO_PROFILES[0] / Path(target.name).name
+            self.add_global(f"{name}.instrumented", str(instrumented), "cxx")
+
+    def parse_compile_cache(self) -> None:
+        compile_cache = self.cxx["compile-cache"]
+        if isinstance(compile_cache, bool):
+            if compile_cache:
+                self.cxx["compile-cache"] = {}
+            else:
+                self.cxx.pop("compile-cache", None)
+            return
+        if not isinstance(compile_cache, dict):
+            self.logger.error("`compile-cache` field in `cxx` section must be a boolean or a object")
+        if compile_cache.get("directory", None) is not None and not isinstance(compile_cache["directory"], str):
+            self.logger.error("`directory` field in `cxx.compile-cache` must be a string")
+        if compile_cache.get("max-size", None) is not None:
+            try:
+                CompileCache.parse_size(compile_cache["max-size"])
+            except (ValueError, TypeError):
+                self.logger.error("`max-size` field in `cxx.compile-cache` must be a size like `512M` or `5G`")
+
+    def parse_unity_build(self) -> None:
+        unity_build = self.cxx["unity-build"]
+        if not isinstance(unity_build, dict):
+            self.logger.error("`unity-build` field in `cxx` section must be a object")
+
+        for field in ("batch-size", "max-bytes"):
+            value = unity_build.get(field, None)
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 1):
+                self.logger.error(f"`{field}` field in `cxx.unity-build` must be a positive integer")
+        if unity_build.get("batch-size", None) is None and unity_build.get("max-bytes", None) is None:
+            unity_build["batch-size"] = 16
+
+        exclude = unity_build.get("exclude", [])
+        if not isinstance(exclude, list) or not all(isinstance(pattern, str) for pattern in exclude):
+            self.logger.error("`exclude` field in `cxx.unity-build` must be a array of strings")
+        unity_build["exclude"] = exclude
+
+    def parse_profiles(self) -> None:
+        """
+        Gathers the build profiles, `debug` and `release` come from `debug-flags` and `release-flags`
+        and `cxx.profiles` can define more of them
+        """
+        profiles: dict[str, list[str]] = {
+            "debug": self.cxx["debug-flags"],
+            "release": self.cxx["release-flags"],
+        }
+
+        if self.cxx.get("profiles", None) is not None:
+            if not isinstance(self.cxx["profiles"], dict):
+                self.logger.error("`profiles` field in `cxx` section must be a object")
+            for name, flags in self.cxx["profiles"].items():
+                profiles[name] = flags
+
+        for name, flags in profiles.items():
+            if re.fullmatch(r"[A-Za-z0-9_-]+", name) is None:
+                self.logger.error(f"profile name `{name}` may only contain letters, digits, `-` and `_`")
+            if not isinstance(flags, list) or not all(isinstance(flag, str) for flag in flags):
+                self.logger.error(f"the flags of profile `{name}` in `cxx` section must be a array of strings")
+            self.profiles[name] = " ".join(flags)
+
+        if self.cxx.get("default-profile", None) is not None:
+            self.default_profile = self.cxx["default-profile"]
+        if self.default_profile not in self.profiles:
+            self.logger.error(f"`default-profile` field in `cxx` section names the unknown profile `{self.default_profile}`")
+
+    def is_clang(self) -> bool:
+        return "clang" in Path(self.cxx["compiler"]).name
+
+    def toolchain_tool(self, gnu: str, llvm: str) -> str:
+        """
+        :return: the tool that belongs to the compiler, `gcc-ar-12` for `g++-12` and `llvm-ar-15` for `clang++-15`
+        """
+        compiler = Path(self.cxx["compiler"])
+        match = re.fullmatch(r"(.*?)(clang\+\+|clang|g\+\+|gcc|c\+\+|cc)(-[0-9.]+)?", compiler.name)
+        if match is None:
+            return llvm if self.is_clang() else gnu
+
+        prefix, driver, version = match.groups()
+        name = f"{llvm}{version or ''}" if driver.startswith("clang") else f"{prefix}{gnu}{version or ''}"
+
+        return str(compiler.with_name(name)) if compiler.parent != Path(".") else name
+
+    def archiver(self) -> str:
+        """
+        :return: `ar`, or the `ar` of the compiler when link time optimization is enabled, it indexes the symbols of the IR objects
+        """
+        if len(self.lto_profiles) == 0:
+            return "ar"
+        return self.toolchain_tool("gcc-ar", "llvm-ar")
+
+    def lto_flags(self) -> str:
+        return "-flto=thin" if self.is_clang() else "-flto=auto"
+
+    @staticmethod
+    def pgo_directory() -> Path:
+        """
+        :return: where the profile data of clang and the file that marks the end of the training are kept
+        """
+        return STATE_DIR / "pgo"
+
+    def pgo_flags(self) -> tuple[str, str]:
+        """
+        gcc writes the profile data of an object next to it, the training copies it to the objects of the optimized stage.
+        clang writes it to the PGO directory, the training merges it into one profile
+
+        :return: the flags of the instrumented and of the optimized stage
+        """
+        if self.is_clang():
+            directory = self.pgo_directory().resolve()
+            return (f"-fprofile-generate={directory}",
+                    f"-fprofile-use={directory / 'default.profdata'} -Wno-profile-instr-unprofiled -Wno-profile-instr-out-of-date")
+        return "-fprofile-generate -fprofile-update=atomic", "-fprofile-use -fprofile-partial-training -Wno-missing-profile"
+
+    def add_lto(self, profiles: list[str]) -> bool:
+        """
+        :param profiles: the profiles that are built with link time optimization, the PGO stages follow the profile they are built on
+        :return: True if a profile changed
+        """
+        if self.pgo_profile in profiles:
+            profiles = list(profiles) + list(PGO_PROFILES)
+
+        changed = False
+        for name in profiles:
+            if name in self.profiles and name not in self.lto_profiles:
+                self.lto_profiles.append(name)
+                self.profiles[name] = f"{self.profiles[name]} {self.lto_flags()}".strip()
+                changed = True
+
+        return changed
+
+    def add_pgo_profiles(self, profile: str) -> bool:
+        """
+        Adds the `pgo-instrument` and `pgo-optimize` profiles, both of them use the flags of `profile` and the flags of their stage
+
+        :return: True if the profiles were added
+        """
+        if self.pgo_profile is not None:
+            return False
+        for name in PGO_PROFILES:
+            if name in self.profiles:
+                self.logger.error(f"`{name}` is the name of a PGO stage, it can not be defined in `cxx.profiles`")
+        if profile not in self.profiles:
+            self.logger.error(f"the PGO stages are built on the unknown profile `{profile}`, known profiles: {' '.join(self.profiles)}")
+
+        self.pgo_profile = profile
+        for name, flags in zip(PGO_PROFILES, self.pgo_flags()):
+            self.profiles[name] = f"{self.profiles[profile]} {flags}".strip()
+            if profile in self.lto_profiles:
+                self.lto_profiles.append(name)
+
+        return True
+
+    def inherit_optimizations(self, config_file: "ConfigFile") -> None:
+        """
+        Builds this dependency with the link time optimization and the PGO stages of `config_file`,
+        so every object of the program is optimized across the whole link and takes part in the training
+        """
+        if config_file.pgo_profile is not None:
+            self.add_pgo_profiles(config_file.pgo_profile)
+        lto = [name for name in config_file.lto_profiles if name not in PGO_PROFILES]
+        if config_file.pgo_profile in config_file.lto_profiles:
+            lto.append(config_file.pgo_profile)
+        self.add_lto(lto)
+
+    def inherited_settings(self) -> tuple:
+        """
+        :return: the settings that a dependency inherits from the config files that use it
+        """
+        return self.position_independent, tuple(self.lto_profiles), self.pgo_profile, tuple(sorted(self.profiles.items()))
+
+    def resolve_inheritance(self) -> None:
+        """
+        Gives every dependency of this top level config file `-fPIC` when it is linked into a shared library and the
+        link time optimization and the PGO stages of the config files that use it. A parsed dependency is shared
+        through `ConfigFile.parsed` by every tree that uses it, so the settings go to copies that belong to this tree
+        and the parsed dependency stays as its own config file defines it
+        """
+        copies: dict[int, ConfigFile] = {}
+
+        def copy_of(config_file: ConfigFile) -> ConfigFile:
+            base = config_file.base
+            if id(base) not in copies:
+                duplicate = copy.copy(base)
+                duplicate.profiles = dict(base.profiles)
+                duplicate.lto_profiles = list(base.lto_profiles)
+                copies[id(base)] = duplicate
+                duplicate.dependencies_config_files = {path: copy_of(dependency) for path, dependency in base.parsed_dependencies.items()}
+            return copies[id(base)]
+
+        self.dependencies_config_files = {path: copy_of(dependency) for path, dependency in self.parsed_dependencies.items()}
+
+        # the config files that use a dependency come before it
+        for config_file in reversed(self.topological_order()):
+            for dependency in config_file.dependencies_config_files.values():
+                if config_file.position_independent:
+                    dependency.position_independent = True
+                dependency.inherit_optimizations(config_file)
+
     def parse_include_directories(self) -> None:
         if self.data.get("include-dirs", None) is None:
             self.logger.info("no `include-dirs` section was specified, skipping...")
@@ -185,7 +1035,7 @@ class ConfigFile:
         if not isinstance(self.include_directories, list):
             self.logger.error("`include-dirs` must be a array that contains strings")
 
-        self.apply_globals(self.include_directories)
+        self.apply_globals(self.include_directories, section="include-dirs")
 
     def parse_library_directories(self) -> None:
         if self.data.get("library-dirs", None) is None:
@@ -195,7 +1045,7 @@ class ConfigFile:
         if not isinstance(self.library_directories, list):
             self.logger.error("`library-dirs` must be a array that contains strings")
 
-        self.apply_globals(self.library_directories)
+        self.apply_globals(self.library_directories, section="library-dirs")
 
     def parse_libraries(self) -> None:
         if self.data.get("libraries", None) is None:
@@ -205,16 +1055,68 @@ class ConfigFile:
         if not isinstance(self.libraries, list):
             self.logger.error("`libraries` must be a array that contains strings")
 
-        self.apply_globals(self.libraries)
+        self.apply_globals(self.libraries, section="libraries")
 
     def parse_source_files(self) -> None:
-        if self.data.get("source-files", None) is None:
+        if self.data.get("source-files", None) is None and self.data.get("source-discovery", None) is None:
             self.logger.error("no `source-files` section was specified, skipping...")
-        self.source_files = self.data["source-files"]
+        self.source_files = self.data.get("source-files", [])
         if not isinstance(self.source_files, list):
             self.logger.error("`source-files` must be a array that contains strings")
 
-        self.apply_globals(self.source_files)
+        self.apply_globals(self.source_files, section="source-files")
+
+        if self.data.get("source-discovery", None) is not None:
+            self.parse_source_discovery()
+
+    @staticmethod
+    def matches_any(path: str, patterns: list[str]) -> bool:
+        for pattern in patterns:
+            if fnmatch.fnmatchcase(path, pattern):
+                return True
+            # `**/` also matches files at the top of the directory
+            if pattern.startswith("**/") and fnmatch.fnmatchcase(path, pattern[3:]):
+                return True
+        return False
+
+    @Timings.timed("source discovery")
+    def parse_source_discovery(self) -> None:
+        discovery = self.data["source-discovery"]
+        if not isinstance(discovery, dict):
+            self.logger.error("`source-discovery` section must be a object")
+
+        include = discovery.get("include", ["**/*.c", "**/*.cpp"])
+        exclude = discovery.get("exclude", [])
+        for name, patterns in (("include", include), ("exclude", exclude)):
+            if not isinstance(patterns, list) or not all(isinstance(pattern, str) for pattern in patterns):
+                self.logger.error(f"`{name}` field in `source-discovery` section must be a array of strings")
+
+        self.apply_globals(include, section="source-discovery")
+        self.apply_globals(exclude, section="source-discovery")
+
+        if ConfigFile.source_index is None:
+            ConfigFile.source_index = SourceIndex()
+            ConfigFile.source_index.load()
+
+        # the source files of a target are linked only into that target
+        known = set(os.path.normpath(file) for file in self.source_files + [file for target in self.targets for file in target.source_files])
+
+        for root, extension in ((self.settings["src-c-dir"], ".c"), (self.settings["src-cpp-dir"], ".cpp")):
+            files, mtimes = ConfigFile.source_index.walk(root)
+            self.scanned_directories.update(mtimes)
+
+            for file in files:
+                if not file.endswith(extension):
+                    continue
+                if not self.matches_any(file, include) or self.matches_any(file, exclude):
+                    continue
+                source = os.path.normpath(os.path.join(root, file))
+                if source in known:
+                    continue
+                if "/" in file and not ConfigFile.parallel_safe:
+                    self.logger.warn(f"discovered `{source}` in a subdirectory of `{root}`, its object file needs --parallel-safe")
+                known.add(source)
+                self.source_files.append(source)
 
     def parse_directories_to_create(self) -> None:
         if self.data.get("directories-to-create", None) is None:
@@ -224,7 +1126,7 @@ class ConfigFile:
         if not isinstance(self.directories_to_create, list):
             self.logger.error("`directories-to-create` must be a array that contains strings")
 
-        self.apply_globals(self.directories_to_create)
+        self.apply_globals(self.directories_to_create, section="directories-to-create")
 
     def parse_settings(self) -> None:
         if self.data.get("settings", None) is None:
@@ -249,10 +1151,11 @@ class ConfigFile:
             if isinstance(self.data["settings"]["libraries-dir"], str):
                 self.settings["libraries-dir"] = self.data["settings"]["libraries-dir"]
             else:
-                self.logger.error(f"`libraries-dir` field in `settings` section must be a string")
+                self.logger.error("`libraries-dir` field in `settings` section must be a string")
 
         self.apply_globals(self.settings, "settings")
 
+    @Timings.timed("parse dependencies")
     def parse_dependencies(self) -> None:
         if self.data.get("dependencies", None) is None:
             self.logger.info("no `dependencies` section was specified, skipping...")
@@ -273,205 +1176,1078 @@ class ConfigFile:
             if not isinstance(dependency_data["globals"], dict):
                 self.logger.error(f"`globals` field in dependency `{config_path}` must be an object")
 
+            link = dependency_data.get("link", None)
+            if link not in (None, "static", "shared"):
+                self.logger.error(f"`link` field in dependency `{config_path}` must be `static` or `shared`")
+
             dependency_globals: dict[str, str] = {}
 
             if dependency_data.get("globals", None) is not None:
                 for name, value in dependency_data["globals"].items():
-                    dependency_globals[name] = self.apply_globals(value)
+                    dependency_globals[name] = self.apply_globals(value, section="dependencies")
 
-            config_file = ConfigFile(config_path)
+            key = (str(Path(config_path).resolve()), json.dumps(dependency_globals, sort_keys=True), str(link))
+            config_file = ConfigFile.parsed.get(key, None)
 
-            for name, value in dependency_globals.items():
-                config_file.add_global(name, value)
+            if config_file is None:
+                config_file = ConfigFile(config_path)
+                config_file.link = link
 
-            config_file.parse()
+                for name, value in dependency_globals.items():
+                    config_file.add_global(name, value, "dependencies")
+
+                config_file.parse()
 
+                ConfigFile.parsed[key] = config_file
+
+            self.parsed_dependencies[config_path] = config_file
             self.dependencies_config_files[config_path] = config_file
 
+    @Timings.timed("parse sections")
     def parse(self) -> None:
+        resolved_path = str(Path(self.path).resolve())
+        if resolved_path in ConfigFile.parsing:
+            cycle = ConfigFile.parsing[ConfigFile.parsing.index(resolved_path):] + [resolved_path]
+            self.logger.error(f"dependency cycle detected: {' -> '.join(cycle)}")
+        ConfigFile.parsing.append(resolved_path)
+
         self.data = self.read_json(self.path)
 
         self.parse_globals()
+        self.register_section_globals()
         self.parse_settings()
+        if self.link is not None:
+            if self.settings["out-type"] == "executable":
+                self.logger.error(f"an executable can not be linked as a `{self.link}` dependency")
+            self.settings["out-type"] = "archive" if self.link == "static" else "shared"
+        if self.data.get("targets", None) is not None and self.settings["out-type"] != "executable":
+            self.logger.error("only a config file with the `executable` out-type can have `targets`")
         if self.settings["out-type"] == "executable":
             self.parse_executable()
         elif self.settings["out-type"] == "archive":
             self.parse_archive()
+        elif self.settings["out-type"] == "shared":
+            self.parse_shared()
+        else:
+            self.logger.error(f"unknown `out-type` `{self.settings['out-type']}`, expected `executable`, `archive` or `shared`")
         self.parse_cxx()
         self.parse_include_directories()
         self.parse_library_directories()
         self.parse_libraries()
         self.parse_source_files()
+        if any(len(target.source_files) > 0 for target in self.targets):
+            self.check_target_source_files()
+        if len(self.targets) > 1 or len(self.all_source_files()) > len(self.source_files):
+            self.check_object_files()
         self.parse_directories_to_create()
         self.parse_dependencies()
+        # resolves the globals that no section used too, so a reference cycle is reported before anything is written
+        self.resolved_globals()
+
+        ConfigFile.parsing.pop()
+
+        if len(ConfigFile.parsing) == 0:
+            self.resolve_inheritance()
+
+    def object_file(self, source: str) -> Path:
+        """
+        :param source: a path from the `source-files` section
+        :return: the object file that the source file is compiled to
+        """
+        if not ConfigFile.parallel_safe:
+            return self.object_directory() / f"{Path(source).name}.o"
+
+        source_dir = self.settings["src-c-dir"] if source.endswith(".c") else self.settings["src-cpp-dir"]
+        relative = os.path.relpath(source, source_dir)
+        if relative.startswith(".."):
+            self.logger.error(f"source file `{source}` is not inside `{source_dir}`")
+
+        return self.object_directory() / f"{relative}.o"
+
+    def object_directory(self) -> Path:
+        """
+        :return: the root of the object files of the current profile
+        """
+        return Path(self.cxx["build-dir"]) / ConfigFile.profile
 
     def source_to_object_files(self) -> str:
         ret = ""
         for file in self.source_files:
-            ret += f"{Path(self.cxx['build-dir']) / Path(file).name}.o "
+            ret += f"{self.object_file(file)} "
 
         return ret
 
-    def make_executable(self, path: os.PathLike) -> None:
-        content = "# AUTO GENERATED FILE DO NOT EDIT\n\n"
+    def all_source_files(self) -> list[str]:
+        """
+        :return: the shared source files followed by the source files that only targets list, each of them once
+        """
+        sources = list(self.source_files)
+        known = set(os.path.normpath(file) for file in sources)
+        for target in self.targets:
+            for source in target.source_files:
+                if os.path.normpath(source) not in known:
+                    known.add(os.path.normpath(source))
+                    sources.append(source)
 
-        if len(self.include_directories) > 0:
-            content += f"INCLUDE_DIRS = -I" + " -I".join(self.include_directories)
-            content += "\n"
-        if len(self.library_directories) > 0:
-            content += f"LIBRARY_DIRS = -L" + " -L".join(self.library_directories)
-            content += "\n"
-        if len(self.libraries) > 0:
-            content += f"LIBRARIES = -l" + " -l".join(self.libraries)
-            content += "\n"
+        return sources
 
-        content += f"BASE_CMD = {self.cxx['compiler']} --std=c++{self.cxx['standard']} {self.cxx['flags']} $(INCLUDE_DIRS)\n"
+    def target_source_files(self, target: Target) -> list[str]:
+        """
+        :return: the source files that `target` links on top of the shared ones
+        """
+        shared = set(os.path.normpath(file) for file in self.source_files)
+        return list(dict.fromkeys(source for source in target.source_files if os.path.normpath(source) not in shared))
 
-        content += f"OBJECT_FILES = {self.source_to_object_files()}\n"
-        content += "EXTRA_LABELS =\n"
+    def object_files_variable(self, prefix: str="") -> str:
+        """
+        :return: the Makefile variables that hold every object file of this config file
+        """
+        if len(self.all_source_files()) == len(self.source_files):
+            return f"$({prefix}OBJECT_FILES)"
+        return f"$({prefix}OBJECT_FILES) $({prefix}TARGET_OBJECT_FILES)"
 
-        for directory in self.directories_to_create:
-            content += f'ifeq ("$(wildcard {directory})", "")\n'
-            content += f'EXTRA_LABELS += {directory}\n'
-            content += f'endif\n'
+    def target_objects_variable(self, target: Target, prefix: str="") -> str:
+        """
+        :return: the Makefile variables that hold the object files that `target` links
+        """
+        if len(self.target_source_files(target)) == 0:
+            return f"$({prefix}OBJECT_FILES)"
+        return f"$({prefix}OBJECT_FILES) $({prefix}TARGET_{target.variable}_OBJECT_FILES)"
 
-        have_dependencies = len(self.dependencies_config_files) > 0
-        if have_dependencies:
-            for name, cfg_file in self.dependencies_config_files.items():
-                path_to_library = Path(self.settings["libraries-dir"]) / f"lib{Path(cfg_file.archive_name).name}.a"
+    def directories(self) -> list[str]:
+        """
+        :return: every directory that has to exist before the targets of this config file can be built
+        """
+        directories: list[str] = []
+        for directory in self.directories_to_create + self.object_directories() + [str(path.parent) for path in self.target_paths()]:
+            # `build/` and `build` would otherwise be two different targets
+            directory = os.path.normpath(directory)
+            if directory != "." and directory not in directories:
+                directories.append(directory)
 
-                content += f"EXTRA_LABELS += {path_to_library}\n"
+        return directories
 
-        archives = ""
+    def compiler_command(self) -> str:
+        """
+        :return: the compiler, routed through the compile cache when `cxx.compile-cache` is enabled
+        """
+        compile_cache = self.cxx.get("compile-cache", None)
+        if compile_cache is None:
+            return self.cxx["compiler"]
 
-        if have_dependencies:
-            for name, cfg_file in self.dependencies_config_files.items():
-                path_to_library = Path(self.settings["libraries-dir"]) / f"lib{Path(cfg_file.archive_name).name}.a"
+        command = [sys.executable, str(Path(__file__).resolve()), "--cache-exec"]
+        if compile_cache.get("directory", None) is not None:
+            command += ["--cache-dir", compile_cache["directory"]]
+        if compile_cache.get("max-size", None) is not None:
+            command += ["--cache-max-size", str(compile_cache["max-size"])]
+        command += ["--", self.cxx["compiler"]]
 
-                archives += f"{path_to_library} "
+        return " ".join(shlex.quote(argument) for argument in command)
 
-        content += f"{self.executable_name}: $(EXTRA_LABELS) $(OBJECT_FILES)\n"
-        content += f"\t$(BASE_CMD) -o {self.executable_name} $(OBJECT_FILES) {archives} $(LIBRARIES)\n"
+    def precompiled_header(self) -> Path | None:
+        """
+        :return: the precompiled version of `cxx.precompiled-header` for the current profile or None when there is none
+        """
+        if self.cxx.get("precompiled-header", None) is None:
+            return None
+        extension = "pch" if "clang" in Path(self.cxx["compiler"]).name else "gch"
+        return self.object_directory() / f"{Path(self.cxx['precompiled-header']).name}.{extension}"
+
+    def precompiled_header_flags(self) -> str:
+        precompiled_header = self.precompiled_header()
+        if precompiled_header is None:
+            return ""
+        # the compiler picks up `<stub>.gch` or `<stub>.pch` in place of the stub that is included,
+        # preprocessing (`-E`) still reads the real header through the stub
+        if precompiled_header.suffix == ".pch":
+            return f"-include {precompiled_header.with_suffix('')}"
+        return f"-Winvalid-pch -include {precompiled_header.with_suffix('')}"
+
+    def unity_directory(self) -> Path:
+        """
+        :return: where the unity source files of this config file are generated, outside of `build-dir`
+        so that `make clean` does not remove them
+        """
+        return STATE_DIR / "unity" / self.state_name()
 
-        content += f'{self.cxx['build-dir']}%.cpp.o: {self.settings["src-cpp-dir"]}%.cpp\n'
-        content += f'\t$(BASE_CMD) -c -o $@ $<\n'
-        content += f'{self.cxx['build-dir']}%.c.o: {self.settings["src-c-dir"]}%.c\n'
-        content += f'\t$(BASE_CMD) -c -o $@ $<\n'
+    def state_name(self) -> str:
+        """
+        :return: a name that is unique to this config file and its `build-dir`, used for its files under `.MakeMake`
+        """
+        key = hashlib.sha256(f"{Path(self.path).resolve()}\0{self.cxx['build-dir']}".encode()).hexdigest()[:12]
+        return f"{self.target_path().stem}-{key}"
 
-        for directory in self.directories_to_create:
-            content += f"{directory}:\n"
-            content += f"\tmkdir -p {directory}\n"
+    def archive_members(self) -> Path:
+        """
+        :return: the file that lists the source files of the archive, it is rewritten only when they change
+        so the archive knows when its members were added or removed
+        """
+        return STATE_DIR / "archives" / f"{self.state_name()}.members"
 
-        if have_dependencies:
-            for name, cfg_file in self.dependencies_config_files.items():
-                path_to_library = Path(self.settings["libraries-dir"]) / f"lib{Path(cfg_file.archive_name).name}.a"
+    def write_archive_members(self) -> list[Path]:
+        """
+        :return: the path of the file that lists the members of the archive or nothing for other out-types
+        """
+        if self.settings["out-type"] != "archive":
+            return []
+        members = self.archive_members()
+        members.parent.mkdir(parents=True, exist_ok=True)
+        content = "thin\n" if self.thin_archive else ""
+        content += "".join(f"{source}\n" for source in self.source_files)
+        self.write_file(members, content)
 
-                content += f"{path_to_library}:\n"
-                content += f"\tmake -f {Path(cfg_file.path).parent / 'Makefile'}\n"
+        return [members]
 
-        content += ".PHONY: clean\n"
-        content += "clean:\n"
-        content += f"\trm -rf {' '.join(self.directories_to_create)}\n"
-        content += f"\trm {self.executable_name}\n"
-        if have_dependencies:
-            for name, cfg_file in self.dependencies_config_files.items():
-                content += f"\tmake -f {Path(cfg_file.path).parent / 'Makefile'} clean\n"
+    def unity_excluded(self, source: str) -> bool:
+        return self.matches_any(os.path.normpath(source), self.cxx["unity-build"]["exclude"])
 
-        self.write_file(path, content)
+    def unity_batches(self) -> dict[Path, list[str]]:
+        """
+        Groups the source files that did not opt out into unity source files, a batch is closed when it
+        holds `batch-size` files or when the next file would take it past `max-bytes`
 
-    def make_archive(self, path: os.PathLike) -> None:
-        content = "# AUTO GENERATED FILE DO NOT EDIT\n\n"
+        :return: every unity source file with the source files that it includes
+        """
+        if self.cxx.get("unity-build", None) is None:
+            return {}
 
-        if len(self.include_directories) > 0:
-            content += f"INCLUDE_DIRS = -I" + " -I".join(self.include_directories)
-            content += "\n"
+        batch_size = self.cxx["unity-build"].get("batch-size", None)
+        max_bytes = self.cxx["unity-build"].get("max-bytes", None)
 
-        content += f"BASE_CMD = {self.cxx['compiler']} --std=c++{self.cxx['standard']} {self.cxx['flags']} $(INCLUDE_DIRS)\n"
+        batches: dict[Path, list[str]] = {}
+        for extension in (".cpp", ".c"):
+            sources = [file for file in self.source_files if file.endswith(extension) and not self.unity_excluded(file)]
+            for batch in self.group_unity_batches(sources, batch_size, max_bytes):
+                batches[self.unity_directory() / f"unity_{len(batches)}{extension}"] = batch
 
-        content += f"OBJECT_FILES = {self.source_to_object_files()}\n"
-        content += "EXTRA_LABELS =\n"
+        return batches
 
-        for directory in self.directories_to_create:
-            content += f'ifeq ("$(wildcard {directory})", "")\n'
-            content += f'EXTRA_LABELS += {directory}\n'
-            content += f'endif\n'
+    @staticmethod
+    def group_unity_batches(sources: list[str], batch_size: int | None, max_bytes: int | None) -> list[list[str]]:
+        """
+        :param sources: source files of one language
+        :return: the sorted sources split into the batches of `unity_batches`
+        """
+        batches: list[list[str]] = []
+        batch: list[str] = []
+        size = 0
+        for source in sorted(sources) + [None]:
+            try:
+                file_size = os.path.getsize(source) if source is not None else 0
+            except OSError:
+                file_size = 0
 
-        archive_name = Path(self.archive_name).parent / (f"lib{Path(self.archive_name).name}.a")
+            full = batch_size is not None and len(batch) >= batch_size
+            full = full or (max_bytes is not None and len(batch) > 0 and size + file_size > max_bytes)
+            if len(batch) > 0 and (full or source is None):
+                batches.append(batch)
+                batch = []
+                size = 0
 
-        content += f"{archive_name}: $(EXTRA_LABELS) $(OBJECT_FILES)\n"
-        content += f"\tar rc -o {archive_name} $(OBJECT_FILES)\n"
+            if source is not None:
+                batch.append(source)
+                size += file_size
 
+        return batches
 
-        content += f'{self.cxx['build-dir']}%.cpp.o: {self.settings["src-cpp-dir"]}%.cpp\n'
-        content += f'\t$(BASE_CMD) -c -o $@ $<\n'
-        content += f'{self.cxx['build-dir']}%.c.o: {self.settings["src-c-dir"]}%.c\n'
-        content += f'\t$(BASE_CMD) -c -o $@ $<\n'
+    def unity_object_file(self, unity_source: Path) -> Path:
+        return self.object_directory() / "unity" / f"{unity_source.name}.o"
 
-        for directory in self.directories_to_create:
-            content += f"{directory}:\n"
-            content += f"\tmkdir -p {directory}\n"
+    def write_unity_files(self) -> list[Path]:
+        """
+        Writes the unity source files, a file that keeps its members is left untouched
+        so its object is not rebuilt
 
-        content += ".PHONY: clean\n"
-        content += "clean:\n"
-        content += f"\trm -rf {' '.join(self.directories_to_create)}\n"
-        content += f"\t"
+        :return: the paths of the unity source files
+        """
+        outputs: list[Path] = []
+        for unity_source, sources in self.unity_batches().items():
+            unity_source.parent.mkdir(parents=True, exist_ok=True)
+            content = "// AUTO GENERATED FILE DO NOT EDIT\n"
+            for source in sources:
+                content += f'#include "{Path(os.path.relpath(source, unity_source.parent)).as_posix()}"\n'
+            self.write_file(unity_source, content)
+            outputs.append(unity_source)
+
+        return outputs
+
+    def object_directories(self) -> list[str]:
+        directories: list[str] = []
+        if self.precompiled_header() is not None:
+            directories.append(str(self.object_directory()))
+        if self.cxx.get("unity-build", None) is not None:
+            directories.append(str(self.object_directory() / "unity"))
+        for file in self.all_source_files():
+            directory = str(self.object_file(file).parent)
+            if directory not in directories:
+                directories.append(directory)
+
+        return directories
+
+    def order_only_prerequisites(self, prefix: str="") -> str:
+        if not ConfigFile.parallel_safe:
+            return ""
+        return f" | $({prefix}DIRECTORIES)"
 
-        self.write_file(path, content)
+    @staticmethod
+    def make_command() -> str:
+        return "$(MAKE)" if ConfigFile.parallel_safe else "make"
 
-    def make(self, path: os.PathLike) -> None:
-        if self.settings["out-type"] == "executable":
-            self.make_executable(path)
-            if len(self.dependencies_config_files) > 0:
-                for config_path, config_file in self.dependencies_config_files.items():
-                    config_file.make(Path(config_file.path).parent / "Makefile")
-        elif self.settings["out-type"] == "archive":
-            self.make_archive(path)
-        else:
-            self.logger.error(f"unknown output type `{self.settings['out-type']}` propably a MakeMake problem")
+    def archive_path(self) -> Path:
+        return Path(self.archive_name).parent / ConfigFile.profile / f"lib{Path(self.archive_name).name}.a"
 
-    def clean(self) -> None:
-        try:
-            self.logger.info(f"attempting to remove Makefile...")
-            Path("./Makefile").unlink()
-        except FileNotFoundError:
-            self.logger.info(f"Makefile not found")
+    def executable_path(self, name: str | None=None) -> Path:
+        """
+        :param name: the name of a target, the name of the `executable` section when None
+        """
+        name = self.executable_name if name is None else name
+        return Path(name).parent / ConfigFile.profile / Path(name).name
 
-        for path in self.directories_to_create:
-            try:
-                self.logger.info(f"attempting to remove {path}...")
-                shutil.rmtree(path)
-            except FileNotFoundError:
-                self.logger.info(f"{path} not found")
+    def shared_path(self) -> Path:
+        return Path(self.shared_name).parent / ConfigFile.profile / f"lib{Path(self.shared_name).name}.so"
 
-        if len(self.dependencies_config_files) > 0:
-            for config_path, config_file in self.dependencies_config_files.items():
-                try:
-                    self.logger.info(f"attempting to remove {Path(config_file.path).parent / 'Makefile'}...")
-                    (Path(config_file.path).parent / "Makefile").unlink()
-                except FileNotFoundError:
-                    self.logger.info(f"{Path(config_file.path).parent / 'Makefile'} not found")
+    def target_path(self) -> Path:
+        """
+        :return: the file that building this config file produces
+        """
+        if self.settings["out-type"] == "executable":
+            return self.executable_path(self.targets[0].name)
+        if self.settings["out-type"] == "shared":
+            return self.shared_path()
+        return self.archive_path()
 
-                for path in config_file.directories_to_create:
-                    try:
-                        self.logger.info(f"attempting to remove {path}...")
-                        shutil.rmtree(path)
-                    except FileNotFoundError:
-                        self.logger.info(f"{path} not found")
+    def target_paths(self) -> list[Path]:
+        """
+        :return: every file that building this config file produces, one for every target of an executable
+        """
+        if self.settings["out-type"] == "executable":
+            return [self.executable_path(target.name) for target in self.targets]
+        return [self.target_path()]
+
+    def link_dependencies(self) -> list["ConfigFile"]:
+        """
+        The archives that are linked into a shared library are not linked again into the config files that use it,
+        every shared library of the graph is linked directly so that the linker resolves the symbols it needs
+
+        :return: the libraries that the executable or shared library of this config file is linked against,
+        the libraries come before the libraries that they use so that the static link resolves
+        """
+        static: set[int] = set()
+
+        def visit(config_file: ConfigFile) -> None:
+            for dependency in config_file.dependencies_config_files.values():
+                if id(dependency) in static:
+                    continue
+                static.add(id(dependency))
+                if dependency.settings["out-type"] != "shared":
+                    visit(dependency)
+
+        visit(self)
+
+        return [
+            config_file for config_file in reversed(self.topological_order()[:-1])
+            if config_file.settings["out-type"] == "shared" or id(config_file) in static
+        ]
+
+    def library_arguments(self, libraries: list[Path], makefile: bool=True, output: Path | None=None) -> list[str]:
+        """
+        Archives are linked by their path, shared libraries through `-L` and `-l` with a `$ORIGIN` relative rpath
+        so the output finds them wherever the build tree is moved
+
+        :param libraries: the archives and the shared libraries that the output of this config file is linked against
+        :param makefile: quote the arguments for a Makefile recipe instead of passing them to a process directly
+        :param output: the file that is linked, `target_path` when None
+        """
+        output = self.target_path() if output is None else output
+        arguments: list[str] = []
+        rpaths: list[str] = []
+        for library in libraries:
+            if library.suffix != ".so":
+                arguments.append(str(library))
+                continue
+            arguments += [f"-L{library.parent}", f"-l{library.stem.removeprefix('lib')}"]
+            rpath = Path(os.path.relpath(library.parent, output.parent)).as_posix()
+            if rpath not in rpaths:
+                rpaths.append(rpath)
+
+        for rpath in rpaths:
+            arguments.append(f"-Wl,-rpath,'$$ORIGIN/{rpath}'" if makefile else f"-Wl,-rpath,$ORIGIN/{rpath}")
+
+        return arguments
+
+    def compile_arguments(self, profile: str) -> list[str]:
+        """
+        :return: `BASE_CMD` as a list of arguments for a concrete profile
+        """
+        arguments = shlex.split(self.compiler_command())
+        arguments.append(f"--std=c++{self.cxx['standard']}")
+        arguments += shlex.split(self.cxx["flags"])
+        if self.position_independent:
+            arguments.append("-fPIC")
+        arguments += shlex.split(self.profiles[profile])
+        arguments += [f"-I{directory}" for directory in self.include_directories]
+
+        return [self.expand_make_variables(argument, profile) for argument in arguments]
+
+    def expand_make_variables(self, argument: str, profile: str) -> str:
+        """
+        Expands the variables that the generated Makefiles define and the environment variables in `argument`
+        like make does, for the commands that run without make
+
+        :param profile: the concrete profile that `$(PROFILE)` stands for
+        """
+        variables = {"PROFILE": profile, "UNITY": "0", "UNITY_SUFFIX": ""}
+
+        def replace(match: re.Match) -> str:
+            name = match.group(1)
+            if name in variables:
+                return variables[name]
+            if name in os.environ:
+                return os.environ[name]
+            self.logger.error(f"`$({name})` in `{argument}` is neither a variable of the generated Makefiles nor an environment variable, "
+                              "only make can expand it")
+
+        if "$(" not in argument:
+            return argument
+        return GLOBAL_REFERENCE.sub(replace, argument)
+
+    def link_arguments(self) -> list[str]:
+        return [f"-L{directory}" for directory in self.library_directories] + [f"-l{library}" for library in self.libraries]
+
+    def make_variables(self, prefix: str="") -> str:
+        """
+        Generates the variables that the rules of this config file use
+
+        :param prefix: prepended to every variable name so that many config files can share one Makefile
+        :return: the variables as Makefile text
+        """
+        content = ""
+
+        if len(self.include_directories) > 0:
+            content += f"{prefix}INCLUDE_DIRS = -I" + " -I".join(self.include_directories)
+            content += "\n"
+        if len(self.library_directories) > 0:
+            content += f"{prefix}LIBRARY_DIRS = -L" + " -L".join(self.library_directories)
+            content += "\n"
+        if len(self.libraries) > 0:
+            content += f"{prefix}LIBRARIES = -l" + " -l".join(self.libraries)
+            content += "\n"
+
+        for name, flags in self.profiles.items():
+            content += f"{prefix}PROFILE_FLAGS_{name} = {flags}\n"
+        content += f"ifeq ($(origin {prefix}PROFILE_FLAGS_$(PROFILE)), undefined)\n"
+        content += f"$(error unknown profile `$(PROFILE)` for `{self.path}`, known profiles: {' '.join(self.profiles)})\n"
+        content += "endif\n"
+
+        position_independent = " -fPIC" if self.position_independent else ""
+        content += f"{prefix}BASE_CMD = {self.compiler_command()} --std=c++{self.cxx['standard']} {self.cxx['flags']}{position_independent} $({prefix}PROFILE_FLAGS_$(PROFILE)) $({prefix}INCLUDE_DIRS)\n"
+
+        content += f"{prefix}OBJECT_FILES = {self.source_to_object_files()}\n"
+
+        target_sources = self.all_source_files()[len(self.source_files):]
+        if len(target_sources) > 0:
+            content += f"{prefix}TARGET_OBJECT_FILES = {' '.join(str(self.object_file(file)) for file in target_sources)}\n"
+            for target in self.targets:
+                sources = self.target_source_files(target)
+                if len(sources) > 0:
+                    content += f"{prefix}TARGET_{target.variable}_OBJECT_FILES = {' '.join(str(self.object_file(file)) for file in sources)}\n"
+
+        if self.cxx.get("unity-build", None) is not None:
+            unity_objects = " ".join(str(self.unity_object_file(unity_source)) for unity_source in self.unity_batches())
+            excluded_objects = " ".join(str(self.object_file(file)) for file in self.source_files if self.unity_excluded(file))
+            content += f"{prefix}UNITY_OBJECT_FILES = {unity_objects}\n"
+            content += "ifeq ($(UNITY),1)\n"
+            content += f"{prefix}OBJECT_FILES = $({prefix}UNITY_OBJECT_FILES) {excluded_objects}\n"
+            content += "endif\n"
+
+        content += f"{prefix}DEPENDENCY_FILES = $({prefix}OBJECT_FILES:.o=.d)\n"
+        if len(target_sources) > 0:
+            content += f"{prefix}DEPENDENCY_FILES += $({prefix}TARGET_OBJECT_FILES:.o=.d)\n"
+
+        if self.precompiled_header() is not None:
+            content += f"{prefix}PRECOMPILED_HEADER = {self.precompiled_header()}\n"
+            content += f"{prefix}PRECOMPILED_HEADER_STUB = {self.precompiled_header().with_suffix('')}\n"
+            content += f"{prefix}PRECOMPILED_HEADER_FLAGS = {self.precompiled_header_flags()}\n"
+            content += f"{prefix}DEPENDENCY_FILES += {self.precompiled_header().with_suffix('.d')}\n"
+        content += f"{prefix}EXTRA_LABELS =\n"
+
+        if ConfigFile.parallel_safe:
+            content += f"{prefix}OBJECT_DIRECTORIES = {' '.join(self.object_directories())}\n"
+            content += f"{prefix}DIRECTORIES = {' '.join(self.directories())}\n"
+            return content
+
+        for directory in self.directories():
+            content += f'ifeq ("$(wildcard {directory})", "")\n'
+            content += f'{prefix}EXTRA_LABELS += {directory}\n'
+            content += 'endif\n'
+
+        return content
+
+    def make_object_rules(self, prefix: str="") -> str:
+        """
+        Generates the rules that compile the source files to object files
+
+        The compiler writes a `.d` file next to every object (`-MMD -MP`) that lists the headers it included,
+        those files are included back so that editing a header rebuilds only the objects that depend on it
+
+        :param prefix: the prefix that was given to `make_variables`
+        :return: the rules as Makefile text
+        """
+        build_dir = f"{self.object_directory()}/"
+
+        objects = f"$(filter-out $({prefix}UNITY_OBJECT_FILES),{self.object_files_variable(prefix)})"
+
+        content = f"$(filter %.cpp.o,{objects}): {build_dir}%.cpp.o: {self.settings['src-cpp-dir']}%.cpp\n"
+        content += f"\t$(TRACE_EXEC) $({prefix}BASE_CMD) $({prefix}PRECOMPILED_HEADER_FLAGS) -MMD -MP -c -o $@ $<\n"
+        content += f"$(filter %.c.o,{objects}): {build_dir}%.c.o: {self.settings['src-c-dir']}%.c\n"
+        content += f"\t$(TRACE_EXEC) $({prefix}BASE_CMD) -MMD -MP -c -o $@ $<\n"
+
+        if self.cxx.get("unity-build", None) is not None:
+            unity_build_dir = f"{self.object_directory() / 'unity'}/"
+            unity_directory = f"{self.unity_directory()}/"
+            content += f"$(filter %.cpp.o,$({prefix}UNITY_OBJECT_FILES)): {unity_build_dir}%.cpp.o: {unity_directory}%.cpp\n"
+            content += f"\t$(TRACE_EXEC) $({prefix}BASE_CMD) $({prefix}PRECOMPILED_HEADER_FLAGS) -MMD -MP -c -o $@ $<\n"
+            content += f"$(filter %.c.o,$({prefix}UNITY_OBJECT_FILES)): {unity_build_dir}%.c.o: {unity_directory}%.c\n"
+            content += f"\t$(TRACE_EXEC) $({prefix}BASE_CMD) -MMD -MP -c -o $@ $<\n"
+        content += f"-include $({prefix}DEPENDENCY_FILES)\n"
+
+        if ConfigFile.parallel_safe:
+            content += f"{self.object_files_variable(prefix)}: | $({prefix}OBJECT_DIRECTORIES)\n"
+
+        if self.pgo_profile is not None:
+            # a new training rebuilds the optimized stage
+            content += f"ifeq ($(PROFILE),{PGO_PROFILES[1]})\n"
+            content += f"{self.object_files_variable(prefix)}: $(wildcard {self.pgo_directory() / 'trained'})\n"
+            content += "endif\n"
+
+        if self.precompiled_header() is not None:
+            content += self.make_precompiled_header_rules(prefix)
+
+        return content
+
+    def make_precompiled_header_rules(self, prefix: str="") -> str:
+        """
+        Generates the rule that precompiles `cxx.precompiled-header` once per profile,
+        every C++ object depends on it and is compiled with it included
+        """
+        order_only = f" | $({prefix}OBJECT_DIRECTORIES)\n" if ConfigFile.parallel_safe else "\n"
+
+        content = f"$({prefix}PRECOMPILED_HEADER_STUB): {self.cxx['precompiled-header']}{order_only}"
+        content += "\tprintf '#include \"%s\"\\n' \"$(abspath $<)\" > $@\n"
+        content += f"$({prefix}PRECOMPILED_HEADER): $({prefix}PRECOMPILED_HEADER_STUB){order_only}"
+        content += f"\t$(TRACE_EXEC) $({prefix}BASE_CMD) -x c++-header -MMD -MP -c -o $@ $<\n"
+        content += f"$(filter %.cpp.o,{self.object_files_variable(prefix)}): $({prefix}PRECOMPILED_HEADER)\n"
+
+        return content
+
+    def make_executable_rule(self, libraries: list[Path], prefix: str="") -> str:
+        """
+        Generates the rule of every target, a target links the shared objects and the objects of its own source files
+
+        :param libraries: the archives and shared libraries that the executable is linked against, they are also prerequisites of it
+        :param prefix: the prefix that was given to `make_variables`
+        """
+        prerequisites = " ".join(str(library) for library in libraries)
+
+        content = ""
+        for target in self.targets:
+            executable = self.executable_path(target.name)
+            objects = self.target_objects_variable(target, prefix)
+            arguments = " ".join(self.library_arguments(libraries, output=executable) + target.link_arguments())
+
+            content += f"{executable}: $({prefix}EXTRA_LABELS) {objects} {prerequisites}{self.order_only_prerequisites(prefix)}\n"
+            content += f"\t$(TRACE_EXEC) $({prefix}BASE_CMD) -o {executable} {objects} {arguments} $({prefix}LIBRARY_DIRS) $({prefix}LIBRARIES)\n"
+
+        return content
+
+    def make_target_aliases(self) -> str:
+        """
+        :return: a phony target for every target of the `targets` section, `make <target>` builds only that executable
+        """
+        labelled = [target for target in self.targets if target.label is not None]
+        if len(labelled) == 0:
+            return ""
+
+        content = f".PHONY: {' '.join(target.label for target in labelled)}\n"
+        for target in labelled:
+            content += f"{target.label}: {self.executable_path(target.name)}\n"
+
+        return content
+
+    def make_shared_rule(self, libraries: list[Path], prefix: str="") -> str:
+        """
+        :param libraries: the archives and shared libraries that the shared library is linked against, they are also prerequisites of it
+        :param prefix: the prefix that was given to `make_variables`
+        """
+        prerequisites = " ".join(str(library) for library in libraries)
+        arguments = " ".join(self.library_arguments(libraries))
+
+        shared = self.shared_path()
+
+        content = f"{shared}: $({prefix}EXTRA_LABELS) $({prefix}OBJECT_FILES) {prerequisites}{self.order_only_prerequisites(prefix)}\n"
+        content += f"\t$(TRACE_EXEC) $({prefix}BASE_CMD) -shared -Wl,-soname,{shared.name} -o {shared} $({prefix}OBJECT_FILES) {arguments} $({prefix}LIBRARY_DIRS) $({prefix}LIBRARIES)\n"
+
+        return content
+
+    def member_names_collide(self) -> bool:
+        """
+        :return: True if two object files of the archive, including its unity objects, have the same basename
+        """
+        objects = [self.object_file(file) for file in self.source_files]
+        objects += [self.unity_object_file(unity_source) for unity_source in self.unity_batches()]
+        names = [path.name for path in dict.fromkeys(objects)]
+        return len(names) != len(set(names))
+
+    def make_archive_rule(self, prefix: str="") -> str:
+        """
+        Generates the rule of the archive. Only the objects that changed (`$?`) are replaced in it and its symbol index
+        is updated, the archive is written again from scratch only when the list of its members changed so that
+        the members of removed source files do not linger. A thin archive is always written again, it holds only
+        the paths of the objects and its index. `ar` names a member after the basename of its object, when two objects
+        share a basename (`--parallel-safe` mirrors the source tree) replacing one of them could replace the other,
+        so such an archive is always written again from scratch
+
+        :param prefix: the prefix that was given to `make_variables`
+        """
+        archive_name = self.archive_path()
+        members = self.archive_members()
+
+        content = f"{archive_name}: $({prefix}EXTRA_LABELS) $({prefix}OBJECT_FILES) {members}{self.order_only_prerequisites(prefix)}\n"
+        if self.thin_archive:
+            content += "\trm -f $@\n"
+            content += f"\t$(TRACE_EXEC) {self.archiver()} rcsT $@ $({prefix}OBJECT_FILES)\n"
+        elif self.member_names_collide():
+            content += "\trm -f $@\n"
+            content += f"\t$(TRACE_EXEC) {self.archiver()} rcs $@ $({prefix}OBJECT_FILES)\n"
+        else:
+            content += f"\t$(if $(filter {members},$?),rm -f $@)\n"
+            content += f"\t$(TRACE_EXEC) {self.archiver()} rcs $@ $(if $(filter {members},$?),$({prefix}OBJECT_FILES),$(filter %.o,$?))\n"
+
+        return content
+
+    def make_pgo_rules(self, recursive: bool=True) -> str:
+        """
+        Generates `make pgo`, which builds the instrumented stage, runs the training commands of `cxx.pgo`
+        and builds the optimized stage with the profile they recorded. `make pgo-train` runs only the training,
+        every stage has its own build and output directories like any other profile
+
+        :param recursive: every dependency has its own Makefile, the stages build them explicitly
+        because the archive of a dependency is only built by the Makefiles that use it when it is missing
+        """
+        if self.pgo_training is None:
+            return ""
+
+        instrument, optimize = PGO_PROFILES
+        pgo_directory = self.pgo_directory()
+        make = f"{self.make_command()} -f $(firstword $(MAKEFILE_LIST))"
+
+        makefiles = [Path(config_file.path).parent / "Makefile" for config_file in self.topological_order()[:-1]] if recursive else []
+
+        content = ".PHONY: pgo pgo-train\n"
+        content += "pgo:\n"
+        for stage in (instrument, None, optimize):
+            if stage is None:
+                content += f"\t{make} pgo-train\n"
+                continue
+            for makefile in makefiles:
+                content += f"\t{self.make_command()} -f {makefile} PROFILE={stage} UNITY=0\n"
+            content += f"\t{make} PROFILE={stage} UNITY=0\n"
+
+        build_directories = list(dict.fromkeys(
+            Path(config_file.cxx["build-dir"]) for config_file in self.topological_order() if config_file.pgo_profile is not None
+        ))
+
+        content += "pgo-train:\n"
+        content += f"\tmkdir -p {pgo_directory}\n"
+        if self.is_clang():
+            content += f"\trm -f {pgo_directory}/*.profraw\n"
+        else:
+            for directory in build_directories:
+                content += f"\tif [ -d {directory / instrument} ]; then find {directory / instrument} -name '*.gcda' -delete; fi\n"
+        for command in self.pgo_training:
+            content += f"\t{command}\n"
+        if self.is_clang():
+            content += f"\t{self.toolchain_tool('llvm-profdata', 'llvm-profdata')} merge -output={pgo_directory / 'default.profdata'} {pgo_directory}/*.profraw\n"
+        else:
+            for directory in build_directories:
+                content += f"\tmkdir -p {directory / optimize} && cd {directory / instrument} && find . -name '*.gcda' -exec cp --parents {{}} $(abspath {directory / optimize})/ \\;\n"
+        content += f"\ttouch {pgo_directory / 'trained'}\n"
+
+        return content
+
+    @staticmethod
+    def make_directory_rules(directories: list[str]) -> str:
+        content = ""
+        for directory in directories:
+            content += f"{directory}:\n"
+            content += f"\tmkdir -p {directory}\n"
+
+        return content
+
+    def make_profile_selection(self) -> str:
+        """
+        :return: the variable that selects the build profile at make time (`make PROFILE=release`)
+        """
+        content = f"PROFILE ?= {self.default_profile}\n"
+        # sub-makes have to build the dependencies with the profile of the Makefile that invoked them
+        content += "export PROFILE\n"
+        # `make UNITY=1` builds the unity source files instead, into their own output directories
+        content += "UNITY ?= 0\n"
+        content += "export UNITY\n"
+        content += "ifeq ($(UNITY),1)\n"
+        content += "UNITY_SUFFIX = -unity\n"
+        content += "endif\n"
+        # `make TRACE=1` records when every compile, archive and link recipe started and ended
+        content += "TRACE ?= 0\n"
+        content += f"TRACE_FILE ?= $(abspath {STATE_DIR / 'trace.jsonl'})\n"
+        content += "export TRACE TRACE_FILE\n"
+        content += "ifeq ($(TRACE),1)\n"
+        trace_exec = " ".join(shlex.quote(argument) for argument in [sys.executable, str(Path(__file__).resolve()), "--trace-exec"])
+        # the prerequisites are recorded so the report can follow the dependency graph that make used
+        content += f"TRACE_EXEC = {trace_exec} --trace-file $(TRACE_FILE) --prerequisites \"$^\" $@ --\n"
+        content += "endif\n"
+
+        return content
+
+    def make_executable(self, path: os.PathLike) -> None:
+        """
+        Generates the Makefile of an executable or of a shared library, both are linked against their dependencies
+        """
+        content = "# AUTO GENERATED FILE DO NOT EDIT\n\n"
+
+        content += self.make_profile_selection()
+
+        content += self.make_variables()
+
+        have_dependencies = len(self.dependencies_config_files) > 0
+
+        libraries: list[Path] = []
+        if have_dependencies:
+            for name, cfg_file in self.dependencies_config_files.items():
+                libraries.append(Path(self.settings["libraries-dir"]) / ConfigFile.profile / cfg_file.target_path().name)
+
+        if self.settings["out-type"] == "shared":
+            content += self.make_shared_rule(libraries)
+        else:
+            if len(self.targets) > 1:
+                # the first rule is the default goal, it has to build every target
+                content += ".PHONY: all\n"
+                content += f"all: {' '.join(str(path) for path in self.target_paths())}\n"
+            content += self.make_target_aliases()
+            content += self.make_executable_rule(libraries)
+
+        content += self.make_object_rules()
+
+        content += self.make_directory_rules(self.directories())
+
+        if have_dependencies:
+            for library, cfg_file in zip(libraries, self.dependencies_config_files.values()):
+                content += f"{library}:\n"
+                content += f"\t{self.make_command()} -f {Path(cfg_file.path).parent / 'Makefile'}\n"
+
+        content += self.make_pgo_rules()
+
+        content += ".PHONY: clean\n"
+        content += "clean:\n"
+        content += f"\trm -rf {' '.join(self.directories_to_create)}\n"
+        content += f"\trm -f {' '.join(str(path) for path in self.target_paths())}\n"
+        if have_dependencies:
+            for name, cfg_file in self.dependencies_config_files.items():
+                content += f"\t{self.make_command()} -f {Path(cfg_file.path).parent / 'Makefile'} clean\n"
+
+        self.write_file(path, content)
+
+    def make_archive(self, path: os.PathLike) -> None:
+        content = "# AUTO GENERATED FILE DO NOT EDIT\n\n"
+
+        content += self.make_profile_selection()
+
+        content += self.make_variables()
+
+        content += self.make_archive_rule()
+
+        content += self.make_object_rules()
+
+        content += self.make_directory_rules(self.directories())
+
+        content += self.make_pgo_rules()
+
+        content += ".PHONY: clean\n"
+        content += "clean:\n"
+        content += f"\trm -rf {' '.join(self.directories_to_create)}\n"
+        content += "\t"
+
+        self.write_file(path, content)
+
+    def make_makefile(self, path: os.PathLike) -> None:
+        if self.settings["out-type"] in ("executable", "shared"):
+            self.make_executable(path)
+        elif self.settings["out-type"] == "archive":
+            self.make_archive(path)
+        else:
+            self.logger.error(f"unknown output type `{self.settings['out-type']}` propably a MakeMake problem")
+
+    @Timings.timed("generate")
+    def make(self, path: os.PathLike) -> list[Path]:
+        """
+        Generates the Makefile of this config file and the Makefiles of its dependencies,
+        a dependency that is shared by many config files gets a single Makefile
+
+        :param path: where the Makefile of this config file will be written
+        :return: the paths of every generated Makefile
+        """
+        outputs: list[Path] = [Path(path)]
+        self.make_makefile(path)
+
+        for config_file in self.topological_order():
+            outputs += config_file.write_unity_files()
+            outputs += config_file.write_archive_members()
+            if config_file is self:
+                continue
+            outputs.append(Path(config_file.path).parent / "Makefile")
+            config_file.make_makefile(outputs[-1])
+
+        return outputs
 
     @staticmethod
+    def variable_prefixes(config_files: list["ConfigFile"]) -> dict[int, str]:
+        """
+        :return: a unique Makefile variable prefix for every config file, keyed by `id`
+        """
+        prefixes: dict[int, str] = {}
+        used: set[str] = set()
+        for config_file in config_files:
+            name = re.sub(r"[^A-Za-z0-9]", "_", config_file.target_path().stem).upper()
+            prefix = f"{name}_"
+            index = 1
+            while prefix in used:
+                index += 1
+                prefix = f"{name}{index}_"
+            used.add(prefix)
+            prefixes[id(config_file)] = prefix
+
+        return prefixes
+
+    @Timings.timed("generate")
+    def make_flat(self, path: os.PathLike) -> list[Path]:
+        """
+        Generates a single non recursive Makefile for this config file and every config file of its dependency graph.
+        Every object, archive and executable is a target of the same make invocation so `make -j` can schedule
+        across libraries and a change inside a dependency relinks everything that uses it
+
+        :param path: where the Makefile will be written
+        :return: the paths of every generated Makefile
+        """
+        config_files = self.topological_order()
+        prefixes = self.variable_prefixes(config_files)
+
+        outputs: list[Path] = [Path(path)]
+
+        content = "# AUTO GENERATED FILE DO NOT EDIT\n\n"
+
+        content += self.make_profile_selection()
+
+        content += ".PHONY: all clean\n"
+        content += f"all: {' '.join(str(path) for config_file in config_files for path in config_file.target_paths())}\n"
+        for config_file in config_files:
+            content += config_file.make_target_aliases()
+
+        directories: list[str] = []
+        for config_file in config_files:
+            prefix = prefixes[id(config_file)]
+
+            content += f"\n# {config_file.path}\n"
+            content += config_file.make_variables(prefix)
+
+            if config_file.settings["out-type"] == "executable":
+                libraries = [dependency.target_path() for dependency in config_file.link_dependencies()]
+                content += config_file.make_executable_rule(libraries, prefix)
+            elif config_file.settings["out-type"] == "shared":
+                libraries = [dependency.target_path() for dependency in config_file.link_dependencies()]
+                content += config_file.make_shared_rule(libraries, prefix)
+            elif config_file.settings["out-type"] == "archive":
+                content += config_file.make_archive_rule(prefix)
+            else:
+                config_file.logger.error(f"unknown output type `{config_file.settings['out-type']}` propably a MakeMake problem")
+
+            content += config_file.make_object_rules(prefix)
+
+            outputs += config_file.write_unity_files()
+            outputs += config_file.write_archive_members()
+
+            for directory in config_file.directories():
+                if directory not in directories:
+                    directories.append(directory)
+
+        content += "\n"
+        content += self.make_directory_rules(directories)
+
+        content += self.make_pgo_rules(recursive=False)
+
+        content += "clean:\n"
+        content += f"\trm -rf {' '.join(dict.fromkeys(d for config_file in config_files for d in config_file.directories_to_create))}\n"
+        content += f"\trm -f {' '.join(str(path) for config_file in config_files for path in config_file.target_paths())}\n"
+
+        self.write_file(path, content)
+
+        return outputs
+
+    @Timings.timed("generate")
+    def make_ninja(self, path: os.PathLike, link_jobs: int, regenerate: list[str]) -> list[Path]:
+        """
+        Generates a single `build.ninja` for this config file and every config file of its dependency graph from the same
+        plan that `--build` runs. Ninja reads the headers of every object from its depfile, runs at most `link_jobs`
+        archive and link steps at once and regenerates the file when a config file changes
+
+        :param path: where the file will be written
+        :param link_jobs: the depth of the pool of the archive and link steps
+        :param regenerate: the arguments of MakeMake that generate this file again
+        :return: the paths of every generated file
+        """
+        writer = NinjaWriter()
+        writer.comment("AUTO GENERATED FILE DO NOT EDIT")
+        writer.variable("ninja_required_version", "1.3")
+        writer.newline()
+
+        writer.pool("link_pool", link_jobs)
+        writer.newline()
+        writer.rule("compile", command="$cmd", depfile="$dep", deps="gcc", description="COMPILE $out")
+        writer.rule("archive", command="rm -f $out && $cmd", pool="link_pool", description="ARCHIVE $out")
+        writer.rule("link", command="$cmd", pool="link_pool", description="LINK $out")
+        regenerate_command = " ".join(shlex.quote(argument) for argument in [sys.executable, str(Path(__file__).resolve())] + regenerate)
+        writer.rule("regenerate", command=writer.escape(regenerate_command), generator="1", restat="1", description="REGENERATE $out")
+        writer.newline()
+
+        config_files = [str(config_file.path) for config_file in self.topological_order()]
+        writer.build([path], "regenerate", config_files, implicit=[Path(__file__).resolve()])
+        writer.newline()
+
+        outputs: list[Path] = [Path(path)]
+        for job in Builder(self, 1, ConfigFile.profile).plan():
+            if job.content is not None:
+                # generated content does not depend on anything that ninja builds, it is written right away
+                job.output.parent.mkdir(parents=True, exist_ok=True)
+                self.write_file(job.output, job.content)
+                outputs.append(job.output)
+                continue
+
+            implicit = [dependency.output for dependency in job.dependencies if dependency.output not in job.inputs]
+            command = writer.escape(" ".join(shlex.quote(argument) for argument in job.command))
+            if job.depfile is not None:
+                writer.build([job.output], "compile", job.inputs, implicit, variables={"cmd": command, "dep": writer.escape_path(job.depfile)})
+            elif job.output.suffix == ".a":
+                writer.build([job.output], "archive", job.inputs, implicit, variables={"cmd": command})
+            else:
+                writer.build([job.output], "link", job.inputs, implicit, variables={"cmd": command})
+
+        writer.newline()
+        for config_file in self.topological_order():
+            for target in config_file.targets:
+                if target.label is not None:
+                    writer.build([target.label], "phony", [config_file.executable_path(target.name)])
+        writer.build(["all"], "phony", [path for config_file in self.topological_order() for path in config_file.target_paths()])
+        writer.buffer.write("default all\n")
+
+        self.write_file(path, writer.getvalue())
+
+        return outputs
+
+    def topological_order(self) -> list["ConfigFile"]:
+        """
+        :return: every config file of the dependency graph exactly once, dependencies before the config files that use them
+        """
+        order: list[ConfigFile] = []
+        visited: set[int] = set()
+
+        def visit(config_file: ConfigFile) -> None:
+            if id(config_file) in visited:
+                return
+            visited.add(id(config_file))
+            for dependency in config_file.dependencies_config_files.values():
+                visit(dependency)
+            order.append(config_file)
+
+        visit(self)
+
+        return order
+
+    def clean(self) -> None:
+        try:
+            self.logger.info("attempting to remove Makefile...")
+            Path("./Makefile").unlink()
+        except FileNotFoundError:
+            self.logger.info("Makefile not found")
+
+        for path in ("build.ninja", ".ninja_log", ".ninja_deps"):
+            try:
+                Path(path).unlink()
+                self.logger.info(f"removed {path}")
+            except FileNotFoundError:
+                pass
+
+        for path in self.directories_to_create:
+            try:
+                self.logger.info(f"attempting to remove {path}...")
+                shutil.rmtree(path)
+            except FileNotFoundError:
+                self.logger.info(f"{path} not found")
+
+        try:
+            self.logger.info(f"attempting to remove {STATE_DIR}...")
+            shutil.rmtree(STATE_DIR)
+        except FileNotFoundError:
+            self.logger.info(f"{STATE_DIR} not found")
+
+        if len(self.dependencies_config_files) > 0:
+            for config_path, config_file in self.dependencies_config_files.items():
+                try:
+                    self.logger.info(f"attempting to remove {Path(config_file.path).parent / 'Makefile'}...")
+                    (Path(config_file.path).parent / "Makefile").unlink()
+                except FileNotFoundError:
+                    self.logger.info(f"{Path(config_file.path).parent / 'Makefile'} not found")
+
+                for path in config_file.directories_to_create:
+                    try:
+                        self.logger.info(f"attempting to remove {path}...")
+                        shutil.rmtree(path)
+                    except FileNotFoundError:
+                        self.logger.info(f"{path} not found")
+
+    @staticmethod
+    @Timings.timed("load json")
     def read_json(path: os.PathLike) -> None:
         with open(path, "r") as f:
             return json.load(f)
 
     @staticmethod
-    def write_file(path: os.PathLike, content: str) -> None:
-        with open(path, "w") as f:
+    @Timings.timed("write files")
+    def write_file(path: os.PathLike, content: str) -> bool:
+        """
+        Writes `content` to `path` only if it differs from what is already there.
+        The file is replaced atomically so make never sees a half written Makefile
+        and its mtime is left alone when nothing changed
+
+        :return: True if the file was written
+        """
+        try:
+            with open(path, "r") as f:
+                if f.read() == content:
+                    return False
+        except (OSError, UnicodeDecodeError):
+            pass
+
+        # unique per writer so that processes and threads that write the same file do not trip over each other
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "w") as f:
             f.write(content)
+        os.replace(temporary_path, path)
+
+        return True
 
     def format(self) -> str:
         data = {
             "path": self.path,
-            "globals": self.globals,
+            "globals": self.resolved_globals(),
             "settings": self.settings,
             "cxx": self.cxx,
             "source_files": self.source_files,
@@ -482,8 +2258,19 @@ class ConfigFile:
         }
         if self.settings["out-type"] == "executable":
             data["executable_name"] = self.executable_name
+            data["targets"] = {
+                target.label: {
+                    "name": target.name,
+                    "source_files": target.source_files,
+                    "libraries": target.libraries,
+                    "library_directories": target.library_directories,
+                }
+                for target in self.targets if target.label is not None
+            }
         elif self.settings["out-type"] == "archive":
             data["archive_name"] = self.archive_name
+        elif self.settings["out-type"] == "shared":
+            data["shared_name"] = self.shared_name
         else:
             self.logger.error(f"unknown output type `{self.settings['out-type']}` propably a MakeMake error")
         if len(self.dependencies_config_files) > 0:
@@ -494,6 +2281,1409 @@ class ConfigFile:
         return data
 
 
+class CompileCache:
+    """
+    A content addressed cache of object files. `BASE_CMD` is routed through `MakeMake.py --cache-exec` which hashes
+    the preprocessed source, the identity of the compiler and the flags and copies the object out of the cache
+    when the same translation unit was already compiled, on any branch or checkout that shares the cache directory
+    """
+    SOURCE_EXTENSIONS: tuple[str, ...] = (".c", ".cc", ".cpp", ".cxx", ".C")
+    # options whose value is the next argument
+    VALUE_OPTIONS: tuple[str, ...] = ("-o", "-MF", "-MT", "-MQ", "-include", "-include-pch", "-x", "-I", "-isystem", "-D", "-U")
+
+    def __init__(self, directory: os.PathLike | None=None, max_size: int | None=None) -> None:
+        if directory is None:
+            directory = os.environ.get("MAKEMAKE_CACHE_DIR", Path.home() / ".cache" / "MakeMake")
+        if max_size is None:
+            max_size = self.parse_size(os.environ.get("MAKEMAKE_CACHE_SIZE", "5G"))
+        self.directory: Path = Path(directory)
+        self.max_size: int = max_size
+        self.logger: Logger = Logger()
+
+    @classmethod
+    def configured(cls, config_path: os.PathLike, directory: os.PathLike | None=None, max_size: str | None=None) -> "CompileCache":
+        """
+        :param config_path: the config file whose `cxx.compile-cache` gives the directory and the size that are not given
+        :return: the cache that the Makefiles of `config_path` use
+        """
+        compile_cache = {}
+        if os.path.exists(config_path):
+            with open(config_path, "r") as f:
+                compile_cache = json.load(f).get("cxx", {}).get("compile-cache", None)
+            if not isinstance(compile_cache, dict):
+                compile_cache = {}
+        if directory is None:
+            directory = compile_cache.get("directory", None)
+        if max_size is None:
+            max_size = compile_cache.get("max-size", None)
+
+        return cls(directory, cls.parse_size(max_size) if max_size is not None else None)
+
+    @staticmethod
+    def parse_size(size: str | int) -> int:
+        """
+        :param size: a number of bytes with an optional `K`, `M` or `G` suffix
+        """
+        if isinstance(size, int):
+            return size
+        units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+        size = size.strip().upper()
+        if size[-1:] in units:
+            return int(float(size[:-1]) * units[size[-1]])
+        return int(size)
+
+    @staticmethod
+    def compile_job(command: list[str]) -> tuple[str | None, str | None]:
+        """
+        :return: the source and the object file of a cacheable compile command, (None, None) for anything else
+        """
+        sources: list[str] = []
+        output: str | None = None
+        compiles = False
+        for index, argument in enumerate(command[1:], 1):
+            previous = command[index - 1]
+            if previous in CompileCache.VALUE_OPTIONS:
+                if previous == "-o":
+                    output = argument
+                if previous == "-x" and argument.endswith("-header"):
+                    # precompiled headers are not object files
+                    return None, None
+                continue
+            if argument == "-c":
+                compiles = True
+            elif argument.startswith("-fprofile-use"):
+                # the object depends on the profile data, which the key does not cover
+                return None, None
+            elif not argument.startswith("-") and argument.endswith(CompileCache.SOURCE_EXTENSIONS):
+                sources.append(argument)
+
+        if not compiles or output is None or len(sources) != 1:
+            return None, None
+        return sources[0], output
+
+    @staticmethod
+    def depfile(command: list[str], output: str) -> str | None:
+        if "-MF" in command:
+            return command[command.index("-MF") + 1]
+        if "-MMD" in command or "-MD" in command:
+            return str(Path(output).with_suffix(".d"))
+        return None
+
+    @staticmethod
+    def preprocess_command(command: list[str]) -> list[str]:
+        preprocess: list[str] = []
+        skip = False
+        for index, argument in enumerate(command):
+            if skip:
+                skip = False
+                continue
+            if argument in ("-o", "-MF", "-MT", "-MQ"):
+                skip = True
+                continue
+            if argument in ("-c", "-MMD", "-MD", "-MP"):
+                continue
+            preprocess.append(argument)
+        preprocess.append("-E")
+
+        return preprocess
+
+    @staticmethod
+    def compiler_identity(compiler: str) -> str:
+        path = shutil.which(compiler) or compiler
+        try:
+            stat = os.stat(path)
+            return f"{os.path.realpath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+        except OSError:
+            return path
+
+    def digest(self, command: list[str], preprocessed: bytes) -> str:
+        hasher = hashlib.sha256()
+        hasher.update(self.compiler_identity(command[0]).encode())
+        hasher.update("\0".join(command[1:]).encode())
+        if any(argument.startswith("-g") for argument in command):
+            # debug information records the directory of the compilation
+            hasher.update(os.getcwd().encode())
+        for index, argument in enumerate(command[:-1]):
+            # clang may preprocess through a precompiled header which then has to be hashed too,
+            # gcc always preprocesses the real header so its `.gch` is left out
+            if argument == "-include-pch":
+                hasher.update(Path(command[index + 1]).read_bytes())
+            elif argument == "-include" and Path(f"{command[index + 1]}.pch").exists():
+                hasher.update(Path(f"{command[index + 1]}.pch").read_bytes())
+        hasher.update(preprocessed)
+
+        return hasher.hexdigest()
+
+    def execute(self, command: list[str]) -> int:
+        """
+        Runs `command` or serves its object file from the cache
+
+        :return: the exit code of the compiler
+        """
+        source, output = self.compile_job(command)
+        if source is None:
+            return subprocess.call(command)
+
+        preprocessed = subprocess.run(self.preprocess_command(command), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if preprocessed.returncode != 0:
+            self.update_stats(uncacheable=1)
+            return subprocess.call(command)
+
+        digest = self.digest(command, preprocessed.stdout)
+        entry = self.directory / digest[:2] / digest[2:]
+        depfile = self.depfile(command, output)
+
+        if (entry / "object").exists():
+            shutil.copyfile(entry / "object", output)
+            if depfile is not None and (entry / "depfile").exists():
+                shutil.copyfile(entry / "depfile", depfile)
+            if (entry / "stderr").exists():
+                sys.stderr.buffer.write((entry / "stderr").read_bytes())
+            # the mtime of an entry is its last use, eviction removes the least recently used entries
+            os.utime(entry)
+            self.update_stats(hits=1)
+            return 0
+
+        compiled = subprocess.run(command, stderr=subprocess.PIPE)
+        sys.stderr.buffer.write(compiled.stderr)
+        if compiled.returncode != 0:
+            return compiled.returncode
+
+        self.store(entry, output, depfile, compiled.stderr)
+
+        return 0
+
+    def store(self, entry: Path, output: str, depfile: str | None, stderr: bytes) -> None:
+        temporary = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+        shutil.rmtree(temporary, ignore_errors=True)
+        temporary.mkdir(parents=True)
+
+        shutil.copyfile(output, temporary / "object")
+        if depfile is not None and os.path.exists(depfile):
+            shutil.copyfile(depfile, temporary / "depfile")
+        if len(stderr) > 0:
+            (temporary / "stderr").write_bytes(stderr)
+
+        size = sum(file.stat().st_size for file in temporary.iterdir())
+        try:
+            os.rename(temporary, entry)
+        except OSError:
+            # another job stored the same entry first
+            shutil.rmtree(temporary, ignore_errors=True)
+            self.update_stats(misses=1)
+            return
+
+        stats = self.update_stats(misses=1, size=size)
+        if stats["size"] > self.max_size:
+            self.evict()
+
+    def update_stats(self, **changes: int) -> dict[str, int]:
+        """
+        Adds `changes` to the statistics of the cache while holding its lock
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / "lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            stats = self.stats()
+            for key, value in changes.items():
+                stats[key] = stats.get(key, 0) + value
+            ConfigFile.write_file(self.directory / "stats.json", json.dumps(stats))
+
+        return stats
+
+    def stats(self) -> dict[str, int]:
+        try:
+            with open(self.directory / "stats.json", "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"hits": 0, "misses": 0, "uncacheable": 0, "size": 0}
+
+    def entries(self) -> list[tuple[Path, int, int]]:
+        """
+        :return: every entry of the cache with its last use and its size
+        """
+        entries: list[tuple[Path, int, int]] = []
+        for bucket in self.directory.iterdir():
+            if not bucket.is_dir():
+                continue
+            for entry in bucket.iterdir():
+                if entry.name.endswith(".tmp"):
+                    continue
+                size = sum(file.stat().st_size for file in entry.iterdir())
+                entries.append((entry, entry.stat().st_mtime_ns, size))
+
+        return entries
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries until the cache is below 90% of its maximum size
+        """
+        entries = sorted(self.entries(), key=lambda entry: entry[1])
+        size = sum(entry[2] for entry in entries)
+        evicted = 0
+        for entry, last_use, entry_size in entries:
+            if size <= self.max_size * 0.9:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            size -= entry_size
+            evicted += 1
+
+        stats = self.stats()
+        self.update_stats(size=size - stats.get("size", 0), evicted=evicted)
+
+    def print_stats(self) -> None:
+        stats = self.stats()
+        lookups = stats.get("hits", 0) + stats.get("misses", 0)
+        hit_rate = 100 * stats.get("hits", 0) / lookups if lookups > 0 else 0
+        print(f"cache directory  {self.directory}")
+        print(f"hits             {stats.get('hits', 0)}")
+        print(f"misses           {stats.get('misses', 0)}")
+        print(f"hit rate         {hit_rate:.1f}%")
+        print(f"uncacheable      {stats.get('uncacheable', 0)}")
+        print(f"evicted          {stats.get('evicted', 0)}")
+        print(f"size             {self.format_size(stats.get('size', 0))} of {self.format_size(self.max_size)}")
+
+    @staticmethod
+    def format_size(size: int) -> str:
+        for unit in ("B", "KiB", "MiB"):
+            if size < 1024:
+                return f"{size:.1f} {unit}"
+            size /= 1024
+        return f"{size:.1f} GiB"
+
+    @staticmethod
+    def main(arguments: list[str]) -> int:
+        """
+        Entry point of `--cache-exec [--cache-dir DIR] [--cache-max-size SIZE] -- <compiler> <arguments>`
+        """
+        directory = consume_arg_value(arguments, "--cache-dir")
+        max_size = consume_arg_value(arguments, "--cache-max-size")
+        if "--" in arguments:
+            arguments = arguments[arguments.index("--") + 1:]
+        if len(arguments) == 0:
+            Logger().error("--cache-exec needs a compiler command")
+
+        cache = CompileCache(directory, CompileCache.parse_size(max_size) if max_size is not None else None)
+
+        return cache.execute(arguments)
+
+
+class Trace:
+    """
+    Start and end times of the recipes that `make TRACE=1` ran. Every compile, archive and link recipe
+    is routed through `MakeMake.py --trace-exec` which appends one JSON line per target to the trace file
+    """
+    def __init__(self, path: os.PathLike | None=None) -> None:
+        self.path: Path = Path(path) if path is not None else STATE_DIR / "trace.jsonl"
+        self.logger: Logger = Logger()
+
+    def execute(self, target: str, command: list[str], prerequisites: list[str] | None=None) -> int:
+        """
+        :param prerequisites: the prerequisites of `target` that make knew, they are the edges of the critical path
+        """
+        start = time.time()
+        try:
+            code = subprocess.call(command)
+        except OSError as error:
+            self.logger.error(f"failed to run `{command[0]}`: {error}", 0)
+            code = 127
+        end = time.time()
+
+        record = json.dumps({"target": target, "start": start, "end": end, "code": code, "command": shlex.join(command),
+                             "prerequisites": prerequisites or []})
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # a single write to a file that is opened for appending is not interleaved with the writes of other recipes
+        descriptor = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(descriptor, (record + "\n").encode())
+        finally:
+            os.close(descriptor)
+
+        return code
+
+    def records(self) -> list[dict]:
+        records: list[dict] = []
+        try:
+            with open(self.path, "r") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            self.logger.error(f"no trace was found at `{self.path}`, run `make TRACE=1` first")
+        return sorted(records, key=lambda record: record["start"])
+
+    @staticmethod
+    def category(target: str) -> str:
+        if target.endswith(".o"):
+            return "compile"
+        if target.endswith((".gch", ".pch")):
+            return "precompiled header"
+        if target.endswith(".a"):
+            return "archive"
+        return "link"
+
+    @staticmethod
+    def lanes(records: list[dict]) -> list[int]:
+        """
+        Assigns every record to the first lane that is free when it starts, the number of lanes is the
+        largest number of recipes that ran at the same time
+
+        :param records: records sorted by their start time
+        :return: the lane of every record
+        """
+        lanes: list[int] = []
+        ends: list[float] = []
+        for record in records:
+            for lane, end in enumerate(ends):
+                if end <= record["start"]:
+                    break
+            else:
+                lane = len(ends)
+                ends.append(0.0)
+            ends[lane] = record["end"]
+            lanes.append(lane)
+        return lanes
+
+    @staticmethod
+    def critical_path(records: list[dict]) -> list[dict]:
+        """
+        The longest chain of recipes through the prerequisites that make recorded (objects, archives and shared libraries,
+        executables), weighted by the recorded durations. A target that ran more than once counts with its last run and
+        a prerequisite only counts when its recipe finished before the recipe that needed it started
+
+        :param records: records sorted by their start time
+        :return: the chain of records, earliest first
+        """
+        latest: dict[str, dict] = {}
+        for record in records:
+            latest[os.path.normpath(record["target"])] = record
+
+        # the longest chain that ends with every target and the target before it in that chain
+        lengths: dict[str, float] = {}
+        previous: dict[str, str | None] = {}
+        for target, record in sorted(latest.items(), key=lambda item: item[1]["end"]):
+            lengths[target] = 0.0
+            previous[target] = None
+            for prerequisite in record.get("prerequisites", []):
+                prerequisite = os.path.normpath(prerequisite)
+                if prerequisite not in lengths or latest[prerequisite]["end"] > record["start"]:
+                    continue
+                if lengths[prerequisite] > lengths[target]:
+                    lengths[target] = lengths[prerequisite]
+                    previous[target] = prerequisite
+            lengths[target] += record["end"] - record["start"]
+
+        if len(lengths) == 0:
+            return []
+        path: list[dict] = []
+        target: str | None = max(lengths, key=lambda target: lengths[target])
+        while target is not None:
+            path.append(latest[target])
+            target = previous[target]
+        return path[::-1]
+
+    def report(self, top: int, chrome_trace: os.PathLike | None) -> None:
+        records = self.records()
+        if len(records) == 0:
+            self.logger.error(f"`{self.path}` has no records")
+
+        lanes = self.lanes(records)
+        begin = records[0]["start"]
+        wall = max(record["end"] for record in records) - begin
+        busy = sum(record["end"] - record["start"] for record in records)
+        cores = max(lanes) + 1
+
+        print(f"{len(records)} recipes in {wall:.2f}s, {busy:.2f}s of work on up to {cores} jobs "
+              f"(average parallelism {busy / wall if wall > 0 else 0:.2f}, {cores * wall - busy:.2f}s idle)")
+
+        print("\nslowest recipes:")
+        for record in sorted(records, key=lambda record: record["end"] - record["start"], reverse=True)[:top]:
+            failed = "" if record.get("code", 0) == 0 else f" (exit code {record['code']})"
+            print(f"    {record['end'] - record['start']:8.2f}s  {self.category(record['target']):18} {record['target']}{failed}")
+
+        if not any(len(record.get("prerequisites", [])) > 0 for record in records):
+            print("\nthe trace has no prerequisites, generate the Makefiles again and run `make TRACE=1` for the critical path")
+        else:
+            path = self.critical_path(records)
+            print(f"\ncritical path through the prerequisites ({sum(record['end'] - record['start'] for record in path):.2f}s):")
+            for record in path:
+                print(f"    {record['start'] - begin:8.2f}s +{record['end'] - record['start']:.2f}s  {record['target']}")
+
+        if chrome_trace is None:
+            return
+
+        events = [
+            {
+                "name": record["target"],
+                "cat": self.category(record["target"]),
+                "ph": "X",
+                "ts": (record["start"] - begin) * 1e6,
+                "dur": (record["end"] - record["start"]) * 1e6,
+                "pid": 1,
+                "tid": lane,
+                "args": {"command": record.get("command", ""), "code": record.get("code", 0)},
+            }
+            for record, lane in zip(records, lanes)
+        ]
+        with open(chrome_trace, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        self.logger.info(f"chrome trace was written to `{chrome_trace}`, open it in chrome://tracing or ui.perfetto.dev")
+
+    @staticmethod
+    def main(arguments: list[str]) -> int:
+        """
+        Entry point of `--trace-exec [--trace-file FILE] [--prerequisites "<prerequisite>..."] <target> -- <command>`
+        """
+        command: list[str] = []
+        if "--" in arguments:
+            command = arguments[arguments.index("--") + 1:]
+            arguments = arguments[:arguments.index("--")]
+        path = consume_arg_value(arguments, "--trace-file")
+        prerequisites = consume_arg_value(arguments, "--prerequisites")
+        if len(arguments) != 1 or len(command) == 0:
+            Logger().error("--trace-exec needs a target and a command")
+
+        return Trace(path).execute(arguments[0], command, prerequisites.split() if prerequisites is not None else None)
+
+
+class IncludeGraph:
+    """
+    The transitive include graph of the source files of a config file tree, it tells which headers are worth
+    a precompiled header or a refactor. The `#include` lines of every file are cached in `.MakeMake/includes.json`
+    together with its mtime and size, so only the files that changed since the last analysis are read again.
+    Includes that are not found next to the including file or in `include-dirs` (the system headers) are left out
+    """
+    DIRECTIVE: re.Pattern = re.compile(rb'^[ \t]*#[ \t]*include[ \t]*([<"])([^>"\n]+)[>"]', re.MULTILINE)
+
+    def __init__(self, config_file: ConfigFile, path: os.PathLike=STATE_DIR / "includes.json") -> None:
+        self.config_file: ConfigFile = config_file
+        self.path: Path = Path(path)
+        # the mtime, the size and the `#include` lines of every file that was read
+        self.files: dict[str, dict] = {}
+        self.dirty: bool = False
+        # the resolved includes of a file for a list of include directories
+        self.edges: dict[tuple[str, tuple[str, ...]], list[str]] = {}
+        self.unresolved: set[str] = set()
+        self.logger: Logger = Logger()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "r") as f:
+                self.files = json.load(f)
+        except (OSError, ValueError):
+            self.files = {}
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        ConfigFile.write_file(self.path, json.dumps(self.files))
+        self.dirty = False
+
+    def scan(self, path: str) -> dict | None:
+        """
+        :return: the size and the `#include` lines of `path` or None if it can not be read
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        entry = self.files.get(path, None)
+        if entry is not None and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry
+
+        try:
+            with open(path, "rb") as f:
+                text = f.read()
+        except OSError:
+            return None
+
+        includes = [[kind.decode(), name.decode(errors="replace").strip()] for kind, name in self.DIRECTIVE.findall(text)]
+        entry = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "includes": includes}
+        self.files[path] = entry
+        self.dirty = True
+
+        return entry
+
+    def includes(self, path: str, include_directories: tuple[str, ...]) -> list[str]:
+        """
+        :return: the files that `path` includes directly, resolved like the compiler does with `-I`
+        """
+        key = (path, include_directories)
+        if key in self.edges:
+            return self.edges[key]
+
+        entry = self.scan(path)
+        resolved: list[str] = []
+        for kind, name in entry["includes"] if entry is not None else []:
+            directories = ((os.path.dirname(path),) if kind == '"' else ()) + include_directories
+            for directory in directories:
+                candidate = os.path.normpath(os.path.join(directory, name))
+                if os.path.isfile(candidate):
+                    resolved.append(candidate)
+                    break
+            else:
+                self.unresolved.add(name)
+
+        self.edges[key] = resolved
+        return resolved
+
+    def closure(self, path: str, include_directories: tuple[str, ...]) -> set[str]:
+        """
+        :return: every file that `path` includes, directly or through other headers
+        """
+        seen: set[str] = set()
+        stack = [path]
+        while len(stack) > 0:
+            for header in self.includes(stack.pop(), include_directories):
+                if header not in seen:
+                    seen.add(header)
+                    stack.append(header)
+        seen.discard(path)
+
+        return seen
+
+    def size(self, path: str) -> int:
+        entry = self.scan(path)
+        return entry["size"] if entry is not None else 0
+
+    def analyze(self, durations: dict[str, float]) -> dict:
+        """
+        Ranks the headers by the number of translation units that include them times their transitive size,
+        the bytes the compiler reads because of them across the build, and by how much an edit of them rebuilds
+
+        :param durations: the compile time of the objects that were built before, keyed by the object file
+        :return: the analysis as a JSON serializable object
+        """
+        units: list[tuple[str, set[str]]] = []
+        seconds: list[float | None] = []
+        header_directories: dict[str, tuple[str, ...]] = {}
+        direct: dict[str, set[str]] = {}
+
+        for config_file in self.config_file.topological_order():
+            include_directories = tuple(os.path.normpath(directory) for directory in config_file.include_directories)
+            precompiled_header = config_file.cxx.get("precompiled-header", None)
+            if precompiled_header is not None:
+                precompiled_header = os.path.normpath(precompiled_header)
+
+            for source in config_file.all_source_files():
+                source = os.path.normpath(source)
+                headers = self.closure(source, include_directories)
+                if precompiled_header is not None and source.endswith(".cpp"):
+                    headers |= {precompiled_header} | self.closure(precompiled_header, include_directories)
+
+                for path in [source] + sorted(headers):
+                    for header in self.includes(path, include_directories):
+                        direct.setdefault(header, set()).add(path)
+                for header in headers:
+                    header_directories.setdefault(header, include_directories)
+
+                units.append((source, headers))
+                seconds.append(durations.get(str(config_file.object_file(source)), None))
+
+        headers: dict[str, dict] = {}
+        for (source, included), duration in zip(units, seconds):
+            for header in included:
+                if header not in headers:
+                    transitive_size = self.size(header) + sum(self.size(path) for path in self.closure(header, header_directories[header]))
+                    headers[header] = {
+                        "header": header,
+                        "size": self.size(header),
+                        "transitive_size": transitive_size,
+                        "direct_includers": len(direct.get(header, ())),
+                        "units": 0,
+                        "rebuild_seconds": None,
+                    }
+                headers[header]["units"] += 1
+                if duration is not None:
+                    headers[header]["rebuild_seconds"] = (headers[header]["rebuild_seconds"] or 0.0) + duration
+
+        for header in headers.values():
+            header["cost"] = header["units"] * header["transitive_size"]
+
+        unit_sizes = [self.size(source) + sum(self.size(header) for header in included) for source, included in units]
+
+        return {
+            "units": len(units),
+            "headers": len(headers),
+            "average_headers_per_unit": sum(len(included) for _, included in units) / len(units) if len(units) > 0 else 0,
+            "average_bytes_per_unit": sum(unit_sizes) / len(units) if len(units) > 0 else 0,
+            "unresolved_includes": sorted(self.unresolved),
+            "hotspots": sorted(headers.values(), key=lambda header: (-header["cost"], header["header"])),
+            "rebuilds": sorted(headers.values(), key=lambda header: (-(header["rebuild_seconds"] or 0.0), -header["units"], header["header"])),
+        }
+
+    def report(self, top: int, as_json: bool, durations: dict[str, float]) -> None:
+        self.load()
+        analysis = self.analyze(durations)
+        self.save()
+
+        if as_json:
+            print(json.dumps(analysis, indent=2))
+            return
+
+        format_size = CompileCache.format_size
+        print(f"{analysis['units']} translation units include {analysis['headers']} headers, "
+              f"{analysis['average_headers_per_unit']:.1f} headers and {format_size(analysis['average_bytes_per_unit'])} per unit on average")
+        if len(analysis["unresolved_includes"]) > 0:
+            print(f"{len(analysis['unresolved_includes'])} includes are not in `include-dirs` (system headers) and are not counted")
+
+        print("\nmost expensive headers (translation units x transitive size):")
+        print(f"    {'cost':>12}  {'units':>6}  {'transitive':>12}  {'direct':>6}  header")
+        for header in analysis["hotspots"][:top]:
+            print(f"    {format_size(header['cost']):>12}  {header['units']:6}  {format_size(header['transitive_size']):>12}  {header['direct_includers']:6}  {header['header']}")
+
+        print("\nlargest rebuilds after editing a single header:")
+        print(f"    {'units':>6}  {'seconds':>8}  header")
+        for header in analysis["rebuilds"][:top]:
+            seconds = f"{header['rebuild_seconds']:8.2f}" if header["rebuild_seconds"] is not None else f"{'?':>8}"
+            print(f"    {header['units']:6}  {seconds}  {header['header']}")
+
+
+class Job:
+    """
+    A single step of a native build: a command (or generated content) that produces `output`
+    """
+    def __init__(self, output: Path, command: list[str] | None, inputs: list[Path], dependencies: list["Job"],
+                 depfile: Path | None=None, content: str | None=None) -> None:
+        self.output: Path = output
+        self.command: list[str] | None = command
+        self.content: str | None = content
+        self.inputs: list[Path] = inputs
+        self.dependencies: list[Job] = dependencies
+        self.depfile: Path | None = depfile
+
+        self.dependents: list[Job] = []
+        self.remaining: int = 0
+        self.ran: bool = False
+
+    def signature(self) -> str:
+        if self.command is not None:
+            return hashlib.sha256("\0".join(self.command).encode()).hexdigest()
+        return hashlib.sha256(self.content.encode()).hexdigest()
+
+    def describe(self) -> str:
+        if self.command is not None:
+            return " ".join(shlex.quote(argument) for argument in self.command)
+        return f"generate {self.output}"
+
+
+class Builder:
+    """
+    Runs the compile, archive and link steps of a parsed config file tree directly, without make.
+    The commands run in a pool of `jobs` workers, the objects of every config file are scheduled at once,
+    an archive or an executable starts as soon as its own inputs are ready and the first failure stops the build
+    """
+    def __init__(self, config_file: ConfigFile, jobs: int, profile: str, state_path: os.PathLike=STATE_DIR / "build-state.json") -> None:
+        self.config_file: ConfigFile = config_file
+        self.jobs: int = jobs
+        self.profile: str = profile
+        self.state_path: Path = Path(state_path)
+        # the command signature and the duration of the last successful run of every output
+        self.state: dict[str, dict] = {}
+        self.logger: Logger = Logger()
+
+    def load_state(self) -> None:
+        try:
+            with open(self.state_path, "r") as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {}
+
+    def save_state(self) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        ConfigFile.write_file(self.state_path, json.dumps(self.state))
+
+    def object_jobs(self, config_file: ConfigFile) -> list[Job]:
+        base = config_file.compile_arguments(self.profile)
+
+        precompiled_header = config_file.precompiled_header()
+        precompiled_header_job: Job | None = None
+        if precompiled_header is not None:
+            stub = precompiled_header.with_suffix("")
+            header = Path(config_file.cxx["precompiled-header"])
+            stub_job = Job(stub, None, [header], [], content=f'#include "{header.resolve()}"\n')
+            precompiled_header_job = Job(
+                precompiled_header,
+                base + ["-x", "c++-header", "-MMD", "-MP", "-c", "-o", str(precompiled_header), str(stub)],
+                [stub], [stub_job], depfile=precompiled_header.with_suffix(".d"),
+            )
+
+        jobs: list[Job] = [] if precompiled_header_job is None else [precompiled_header_job.dependencies[0], precompiled_header_job]
+        for source in config_file.all_source_files():
+            object_file = config_file.object_file(source)
+            command = base[:]
+            dependencies: list[Job] = []
+            if source.endswith(".cpp") and precompiled_header_job is not None:
+                command += shlex.split(config_file.precompiled_header_flags())
+                dependencies.append(precompiled_header_job)
+            command += ["-MMD", "-MP", "-c", "-o", str(object_file), source]
+            inputs = [Path(source)]
+            if self.profile == PGO_PROFILES[1] and (config_file.pgo_directory() / "trained").exists():
+                # a new training rebuilds the optimized stage
+                inputs.append(config_file.pgo_directory() / "trained")
+            jobs.append(Job(object_file, command, inputs, dependencies, depfile=object_file.with_suffix(".d")))
+
+        return jobs
+
+    def plan(self) -> list[Job]:
+        """
+        :return: every job of the build, dependencies before the jobs that use them
+        """
+        jobs: list[Job] = []
+        targets: dict[int, Job] = {}
+
+        for config_file in self.config_file.topological_order():
+            if self.profile not in config_file.profiles:
+                config_file.logger.error(f"unknown profile `{self.profile}`, known profiles: {' '.join(config_file.profiles)}")
+
+            object_jobs = self.object_jobs(config_file)
+            jobs += object_jobs
+            objects = [job for job in object_jobs if job.output.suffix == ".o"]
+
+            if config_file.settings["out-type"] in ("executable", "shared"):
+                dependencies = [targets[id(dependency)] for dependency in config_file.link_dependencies()]
+                libraries = [job.output for job in dependencies]
+
+                links: list[tuple[Path, list[Job], list[str]]] = []
+                if config_file.settings["out-type"] == "shared":
+                    links.append((config_file.target_path(), objects, []))
+                else:
+                    # every target links the same jobs for the shared objects, each of them is compiled once
+                    by_output = {job.output: job for job in objects}
+                    for executable in config_file.targets:
+                        sources = config_file.source_files + config_file.target_source_files(executable)
+                        target_objects = list(dict.fromkeys(by_output[config_file.object_file(source)] for source in sources))
+                        links.append((config_file.executable_path(executable.name), target_objects, executable.link_arguments()))
+
+                for output, target_objects, target_arguments in links:
+                    command = config_file.compile_arguments(self.profile)
+                    if config_file.settings["out-type"] == "shared":
+                        command += ["-shared", f"-Wl,-soname,{output.name}"]
+                    command += ["-o", str(output)] + [str(job.output) for job in target_objects]
+                    command += config_file.library_arguments(libraries, makefile=False, output=output)
+                    command += [config_file.expand_make_variables(argument, self.profile) for argument in target_arguments + config_file.link_arguments()]
+                    target = Job(output, command, [job.output for job in target_objects + dependencies], target_objects + dependencies)
+                    jobs.append(target)
+            else:
+                archive = config_file.archive_path()
+                command = [config_file.archiver(), "rcsT" if config_file.thin_archive else "rcs", str(archive)] + [str(job.output) for job in objects]
+                target = Job(archive, command, [job.output for job in objects], objects)
+                jobs.append(target)
+
+            targets[id(config_file)] = target
+
+        return jobs
+
+    @staticmethod
+    def read_depfile(path: Path) -> list[Path]:
+        """
+        :return: the prerequisites of the first rule of a depfile written by `-MMD`
+        """
+        try:
+            with open(path, "r") as f:
+                text = f.read()
+        except OSError:
+            return []
+
+        text = text.replace("\\\n", " ")
+        rule = text.split("\n", 1)[0]
+        _, _, prerequisites = rule.partition(": ")
+        return [Path(prerequisite.replace("\\ ", " ")) for prerequisite in re.split(r"(?<!\\)\s+", prerequisites.strip()) if prerequisite]
+
+    def is_up_to_date(self, job: Job) -> bool:
+        if any(dependency.ran for dependency in job.dependencies):
+            return False
+        if self.state.get(str(job.output), {}).get("command", None) != job.signature():
+            return False
+        try:
+            output_mtime = os.stat(job.output).st_mtime_ns
+        except OSError:
+            return False
+
+        inputs = job.inputs + (self.read_depfile(job.depfile) if job.depfile is not None else [])
+        for path in inputs:
+            try:
+                if os.stat(path).st_mtime_ns > output_mtime:
+                    return False
+            except OSError:
+                return False
+
+        return True
+
+    def execute(self, job: Job) -> tuple[int, float]:
+        """
+        Runs in a worker of the pool
+
+        :return: the exit code and the duration of the job
+        """
+        start = time.monotonic()
+        job.output.parent.mkdir(parents=True, exist_ok=True)
+        if job.content is not None:
+            ConfigFile.write_file(job.output, job.content)
+            return 0, time.monotonic() - start
+
+        if job.output.suffix == ".a":
+            # a fresh archive never keeps the members of deleted source files
+            job.output.unlink(missing_ok=True)
+        code = subprocess.call(job.command)
+
+        return code, time.monotonic() - start
+
+    def run(self, jobs: list[Job] | None=None) -> int:
+        """
+        :param jobs: the jobs to run, every job of the plan when None. The dependencies of every job must be part of it
+        :return: 0 if every output is up to date at the end, 1 otherwise
+        """
+        self.load_state()
+
+        for config_file in self.config_file.topological_order():
+            for directory in config_file.directories_to_create:
+                os.makedirs(directory, exist_ok=True)
+
+        if jobs is None:
+            jobs = self.plan()
+        for job in jobs:
+            job.remaining = len(job.dependencies)
+            for dependency in job.dependencies:
+                dependency.dependents.append(job)
+
+        ready: list[Job] = [job for job in jobs if job.remaining == 0]
+        running: dict[concurrent.futures.Future, Job] = {}
+        failed = False
+        executed = 0
+
+        def finish(job: Job) -> None:
+            for dependent in job.dependents:
+                dependent.remaining -= 1
+                if dependent.remaining == 0:
+                    ready.append(dependent)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            while True:
+                while len(ready) > 0 and not failed:
+                    job = ready.pop()
+                    if self.is_up_to_date(job):
+                        finish(job)
+                        continue
+                    if not Logger.silent:
+                        print(job.describe(), flush=True)
+                    running[pool.submit(self.execute, job)] = job
+
+                if len(running) == 0:
+                    break
+
+                finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    job = running.pop(future)
+                    code, duration = future.result()
+                    if code != 0:
+                        self.logger.error(f"building `{job.output}` failed with exit code {code}", 0)
+                        failed = True
+                        continue
+                    job.ran = True
+                    executed += 1
+                    self.state[str(job.output)] = {"command": job.signature(), "duration": duration}
+                    finish(job)
+
+        self.save_state()
+
+        if failed:
+            return 1
+        if executed == 0:
+            self.logger.info(f"`{self.config_file.target_path()}` is up to date")
+
+        return 0
+
+
+class Shard:
+    """
+    Splits the compilation of a config file tree across machines. `--shard i/N` compiles only the objects of shard `i`
+    and copies them into a shared artifact directory, `--link-shards` takes every object from there and runs only the
+    archive and link steps. The split is deterministic: the objects are weighted by their compile times that the last
+    `--link-shards` merged into the artifact directory (or by the size of their source file when it is unknown) and
+    handed out largest first to the lightest shard. The build state of the checkout is never used, it changes as soon
+    as one shard finishes and the shards that run after it would split the objects another way
+    """
+    def __init__(self, builder: Builder, artifact_directory: os.PathLike, weights_path: os.PathLike | None=None) -> None:
+        self.builder: Builder = builder
+        self.artifact_directory: Path = Path(artifact_directory)
+        self.weights_path: Path | None = Path(weights_path) if weights_path is not None else None
+        self.logger: Logger = Logger()
+
+    @staticmethod
+    def parse(shard: str) -> tuple[int, int]:
+        """
+        :param shard: `i/N` with 1 <= i <= N
+        :return: the index of the shard starting from 0 and the number of shards
+        """
+        index, _, count = shard.partition("/")
+        if not index.isdigit() or not count.isdigit() or not 1 <= int(index) <= int(count):
+            Logger().error(f"`--shard` expects `i/N` with 1 <= i <= N, got `{shard}`")
+        return int(index) - 1, int(count)
+
+    def artifact(self, path: Path) -> Path:
+        return self.artifact_directory / path.as_posix().lstrip("/")
+
+    def history(self) -> dict[str, float]:
+        """
+        :return: the compile time of every object that is known, from `--shard-weights` or else from the
+                 `durations.json` of the artifact directory, which only changes when the shards are linked
+        """
+        path = self.weights_path
+        if path is None:
+            path = self.artifact_directory / "durations.json"
+            if not path.exists():
+                return {}
+
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as error:
+            self.logger.error(f"could not read the shard weights `{path}`: {error}")
+
+    def weights(self, objects: list[Job]) -> dict[Path, float]:
+        """
+        The size of a source file is turned into seconds with the average compile speed of the objects whose compile time
+        is known, without any history the sizes are used as they are
+        """
+        history = self.history()
+        sizes: dict[Path, int] = {}
+        for job in objects:
+            try:
+                sizes[job.output] = sum(os.stat(path).st_size for path in job.inputs)
+            except OSError:
+                sizes[job.output] = 0
+
+        known = [job.output for job in objects if str(job.output) in history]
+        known_size = sum(sizes[output] for output in known)
+        seconds_per_byte = sum(history[str(output)] for output in known) / known_size if known_size > 0 else 1.0
+
+        return {
+            job.output: history[str(job.output)] if str(job.output) in history else sizes[job.output] * seconds_per_byte
+            for job in objects
+        }
+
+    def assign(self, objects: list[Job], count: int) -> list[list[Job]]:
+        weights = self.weights(objects)
+        shards: list[list[Job]] = [[] for _ in range(count)]
+        loads: list[float] = [0.0] * count
+        for job in sorted(objects, key=lambda job: (-weights[job.output], str(job.output))):
+            lightest = min(range(count), key=lambda index: (loads[index], index))
+            shards[lightest].append(job)
+            loads[lightest] += weights[job.output]
+        return shards
+
+    @staticmethod
+    def closure(jobs: list[Job]) -> list[Job]:
+        """
+        :return: `jobs` together with every job that they depend on, dependencies first
+        """
+        selected: list[Job] = []
+        visited: set[int] = set()
+
+        def visit(job: Job) -> None:
+            if id(job) in visited:
+                return
+            visited.add(id(job))
+            for dependency in job.dependencies:
+                visit(dependency)
+            selected.append(job)
+
+        for job in jobs:
+            visit(job)
+        return selected
+
+    def build(self, index: int, count: int) -> int:
+        """
+        Compiles the objects of shard `index` and copies them with their depfiles into the artifact directory
+        """
+        objects = [job for job in self.builder.plan() if job.output.suffix == ".o"]
+        mine = self.assign(objects, count)[index]
+        self.logger.info(f"shard {index + 1}/{count} compiles {len(mine)} of {len(objects)} objects")
+
+        code = self.builder.run(self.closure(mine))
+        if code != 0:
+            return code
+
+        durations: dict[str, float] = {}
+        for job in mine:
+            for path in (job.output, job.depfile):
+                if path is not None and path.exists():
+                    self.artifact(path).parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copy2(path, self.artifact(path))
+            durations[str(job.output)] = self.builder.state.get(str(job.output), {}).get("duration", 0.0)
+
+        manifest = {"shard": index + 1, "count": count, "profile": self.builder.profile, "durations": durations}
+        ConfigFile.write_file(self.artifact_directory / f"shard-{index + 1}-of-{count}.json", json.dumps(manifest, indent=2))
+
+        return 0
+
+    def link(self) -> int:
+        """
+        Copies every object out of the artifact directory and runs the archive and link steps only.
+        The compile times of all the shards are merged into `durations.json` for `--shard-weights`
+        """
+        jobs = self.builder.plan()
+        objects = [job for job in jobs if job.output.suffix == ".o"]
+
+        missing = [job.output for job in objects if not self.artifact(job.output).exists()]
+        if len(missing) > 0:
+            self.logger.error(f"{len(missing)} objects are missing from `{self.artifact_directory}`, the first one is `{missing[0]}`. "
+                              "Did every shard run with the same --shard-weights and profile?")
+
+        for job in objects:
+            for path in (job.output, job.depfile):
+                if path is not None and self.artifact(path).exists():
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copy2(self.artifact(path), path)
+
+        compiled = {id(job) for job in self.closure(objects)}
+        remaining = [job for job in jobs if id(job) not in compiled]
+        for job in remaining:
+            job.dependencies = [dependency for dependency in job.dependencies if id(dependency) not in compiled]
+
+        code = self.builder.run(remaining)
+
+        durations: dict[str, float] = {}
+        for manifest in sorted(self.artifact_directory.glob("shard-*-of-*.json")):
+            with open(manifest, "r") as f:
+                durations.update(json.load(f).get("durations", {}))
+        ConfigFile.write_file(self.artifact_directory / "durations.json", json.dumps(durations, indent=2, sort_keys=True))
+
+        return code
+
+
+class Watcher:
+    """
+    Keeps the parsed config file tree in memory and polls the config files and the source trees.
+    A burst of changes is handled once it settles: changed config files are parsed again together with the config files
+    that depend on them (every other config file is reused from `ConfigFile.parsed`) and the Makefiles are regenerated,
+    only the ones whose content changed are written. After every change it can rebuild right away with `--build` or make
+    """
+    # how often the files are polled in seconds
+    INTERVAL: float = 0.25
+    WATCHED_EXTENSIONS: tuple[str, ...] = (".c", ".cc", ".cpp", ".cxx", ".C", ".h", ".hh", ".hpp", ".hxx", ".inl", ".ipp")
+
+    def __init__(self, path: os.PathLike, options: list[str], flat: bool, rebuild: str | None, jobs: int,
+                 profile: str | None, debounce: float) -> None:
+        """
+        :param rebuild: `build` to rebuild with the builder of `--build`, `make` to run make or None to only regenerate
+        """
+        self.path: os.PathLike = path
+        self.options: list[str] = options
+        self.flat: bool = flat
+        self.rebuild: str | None = rebuild
+        self.jobs: int = jobs
+        self.profile: str | None = profile
+        self.debounce: float = debounce
+        self.config_file: ConfigFile | None = None
+        self.stamp: Stamp = Stamp()
+        self.logger: Logger = Logger()
+
+    def parse(self, changed_configs: set[str]) -> bool:
+        """
+        Parses the config file tree again, the config files in `changed_configs` and every config file that depends
+        on them are dropped from `ConfigFile.parsed` first, the rest of the tree is reused as it is
+
+        :param changed_configs: resolved paths of the config files that changed
+        :return: False if the tree has an error, the previous tree is kept then
+        """
+        if self.config_file is not None:
+            stale: set[int] = set()
+            for config_file in self.config_file.topological_order():
+                if str(Path(config_file.path).resolve()) in changed_configs or \
+                        any(id(dependency.base) in stale for dependency in config_file.dependencies_config_files.values()):
+                    stale.add(id(config_file.base))
+            for key, config_file in list(ConfigFile.parsed.items()):
+                if id(config_file) in stale:
+                    del ConfigFile.parsed[key]
+
+        config_file = ConfigFile(self.path)
+        try:
+            config_file.parse()
+        except (SystemExit, ValueError) as error:
+            if isinstance(error, ValueError):
+                self.logger.error(f"invalid JSON: {error}", 0)
+            ConfigFile.parsing.clear()
+            self.logger.warn("the config files have errors, waiting for the next change...")
+            return False
+
+        self.config_file = config_file
+        return True
+
+    def generate(self) -> None:
+        if self.flat:
+            outputs = self.config_file.make_flat("./Makefile")
+        else:
+            outputs = self.config_file.make("./Makefile")
+
+        self.stamp.record(self.config_file, self.options, outputs)
+        self.stamp.save()
+        if ConfigFile.source_index is not None:
+            ConfigFile.source_index.save()
+
+    def build(self) -> None:
+        if self.rebuild == "build":
+            # the builder works on the paths of a concrete profile, the Makefiles select it at make time
+            makefile_profile = ConfigFile.profile
+            ConfigFile.profile = self.profile or self.config_file.default_profile
+            try:
+                code = Builder(self.config_file, self.jobs, ConfigFile.profile).run()
+            except SystemExit as error:
+                code = error.code
+            finally:
+                ConfigFile.profile = makefile_profile
+        elif self.rebuild == "make":
+            command = ["make", f"-j{self.jobs}"]
+            if self.profile is not None:
+                command.append(f"PROFILE={self.profile}")
+            code = subprocess.call(command)
+        else:
+            return
+
+        if code == 0:
+            self.logger.info("build finished, watching for changes...")
+        else:
+            self.logger.warn("build failed, watching for changes...")
+
+    def watched_directories(self) -> list[str]:
+        directories: list[str] = []
+        for config_file in self.config_file.topological_order():
+            for directory in [config_file.settings["src-c-dir"], config_file.settings["src-cpp-dir"]] + config_file.include_directories:
+                directory = os.path.normpath(directory)
+                if directory not in directories and os.path.isdir(directory):
+                    directories.append(directory)
+        return directories
+
+    def snapshot(self) -> dict[str, int]:
+        """
+        :return: the mtime of every config file of the tree and of every source file and header under the watched directories
+        """
+        mtimes: dict[str, int] = {}
+        for config_file in self.config_file.topological_order():
+            try:
+                mtimes[str(Path(config_file.path).resolve())] = os.stat(config_file.path).st_mtime_ns
+            except OSError:
+                mtimes[str(Path(config_file.path).resolve())] = 0
+
+        state_directory = STATE_DIR.resolve()
+        for directory in self.watched_directories():
+            for root, directories, files in os.walk(directory):
+                directories[:] = [name for name in directories if Path(root, name).resolve() != state_directory]
+                for name in files:
+                    if not name.endswith(self.WATCHED_EXTENSIONS):
+                        continue
+                    path = str(Path(root, name).resolve())
+                    try:
+                        mtimes[path] = os.stat(path).st_mtime_ns
+                    except OSError:
+                        continue
+
+        return mtimes
+
+    def changed_configs(self, previous: dict[str, int], current: dict[str, int]) -> set[str]:
+        """
+        :return: the config files that changed, a config file with `source-discovery` changes when
+        a source file is added to or removed from its source directories
+        """
+        changed = {path for path in previous.keys() | current.keys() if previous.get(path) != current.get(path)}
+        added_or_removed = previous.keys() ^ current.keys()
+
+        configs: set[str] = set()
+        for config_file in self.config_file.topological_order():
+            resolved_path = str(Path(config_file.path).resolve())
+            if resolved_path in changed:
+                configs.add(resolved_path)
+                continue
+            if config_file.data.get("source-discovery", None) is None:
+                continue
+            source_directories = {str(Path(config_file.settings[key]).resolve()) for key in ("src-c-dir", "src-cpp-dir")}
+            for path in added_or_removed:
+                if any(path.startswith(directory + os.sep) for directory in source_directories):
+                    configs.add(resolved_path)
+                    break
+
+        return configs
+
+    def run(self) -> int:
+        if not self.parse(set()):
+            return 1
+        self.generate()
+        self.build()
+
+        previous = self.snapshot()
+        self.logger.info(f"watching {len(self.config_file.topological_order())} config files and {len(previous)} files, press Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(self.INTERVAL)
+                current = self.snapshot()
+                if current == previous:
+                    continue
+
+                # wait for the burst of saves to settle
+                while True:
+                    time.sleep(self.debounce)
+                    latest = self.snapshot()
+                    if latest == current:
+                        break
+                    current = latest
+
+                changed_configs = self.changed_configs(previous, current)
+                if len(changed_configs) > 0:
+                    self.logger.info(f"config files changed: {' '.join(os.path.relpath(path) for path in sorted(changed_configs))}")
+                    if self.parse(changed_configs):
+                        self.generate()
+                        self.build()
+                else:
+                    self.build()
+
+                previous = self.snapshot()
+        except KeyboardInterrupt:
+            return 0
+
+
+class Batch:
+    """
+    Generates the Makefiles of many top level config files in one run. A config file is parsed once for every set of
+    globals it is given and shared through `ConfigFile.parsed` by every project that depends on it, then the Makefiles
+    are generated in a pool of workers. The Makefile of a top level config file is written next to it
+    """
+    # the config files that the workers generate, set before the pool starts so forked workers inherit it
+    tasks: list[tuple["ConfigFile", bool]] = []
+
+    def __init__(self, patterns: list[str], options: list[str], flat: bool, jobs: int, force: bool) -> None:
+        self.patterns: list[str] = patterns
+        self.options: list[str] = options
+        self.flat: bool = flat
+        self.jobs: int = jobs
+        self.force: bool = force
+        self.logger: Logger = Logger()
+
+    def expand(self) -> list[str]:
+        """
+        :return: the config files that the patterns match, every config file once
+        """
+        files: list[str] = []
+        resolved: set[str] = set()
+        for pattern in self.patterns:
+            matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+            if len(matches) == 0:
+                self.logger.warn(f"`{pattern}` does not match any config file")
+            for match in matches:
+                if not os.path.isfile(match):
+                    self.logger.error(f"config file `{match}` not found")
+                if str(Path(match).resolve()) not in resolved:
+                    resolved.add(str(Path(match).resolve()))
+                    files.append(match)
+        return files
+
+    @staticmethod
+    def stamp(path: str) -> Stamp:
+        key = hashlib.sha256(str(Path(path).resolve()).encode()).hexdigest()[:16]
+        return Stamp(STATE_DIR / "stamps" / f"{key}.json")
+
+    @staticmethod
+    def task_key(config_file: "ConfigFile") -> tuple:
+        return id(config_file.base), config_file.inherited_settings()
+
+    @staticmethod
+    def makefile(config_file: "ConfigFile") -> Path:
+        return Path(config_file.path).parent / "Makefile"
+
+    @staticmethod
+    def generate(index: int) -> list[str]:
+        """
+        Runs in a worker of the pool
+
+        :return: the paths of the files that were generated
+        """
+        config_file, flat = Batch.tasks[index]
+        if flat:
+            return [str(output) for output in config_file.make_flat(Batch.makefile(config_file))]
+
+        config_file.make_makefile(Batch.makefile(config_file))
+        outputs = [Batch.makefile(config_file)] + config_file.write_unity_files() + config_file.write_archive_members()
+        return [str(output) for output in outputs]
+
+    def executor(self) -> concurrent.futures.Executor:
+        """
+        Generating a Makefile is Python work that threads can not run in parallel, so the workers are forked processes
+        that inherit the parsed config files. Where fork is not available the workers are threads
+        """
+        if self.jobs > 1 and "fork" in multiprocessing.get_all_start_methods():
+            return concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs, mp_context=multiprocessing.get_context("fork"))
+        return concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs)
+
+    def run(self) -> int:
+        files = self.expand()
+
+        stamps: dict[str, Stamp] = {}
+        for file in files:
+            stamps[file] = self.stamp(file)
+            if not self.force:
+                stamps[file].load()
+        stale = [file for file in files if self.force or not stamps[file].is_up_to_date(file, self.options)]
+        self.logger.info(f"{len(files) - len(stale)} of {len(files)} projects are up to date")
+        if len(stale) == 0:
+            return 0
+
+        roots: dict[str, ConfigFile] = {}
+        for file in stale:
+            # a top level config file that is also a dependency without globals is the same config file
+            key = (str(Path(file).resolve()), json.dumps({}, sort_keys=True), str(None))
+            config_file = ConfigFile.parsed.get(key, None)
+            if config_file is None:
+                config_file = ConfigFile(file)
+                config_file.parse()
+                ConfigFile.parsed[key] = config_file
+            roots[file] = config_file
+
+        if self.flat:
+            Batch.tasks = [(config_file, True) for config_file in roots.values()]
+        else:
+            # every project has its own copies of the dependencies, the copies that inherited the same settings share a Makefile
+            unique: dict[tuple, ConfigFile] = {}
+            for config_file in roots.values():
+                for dependency in config_file.topological_order():
+                    unique.setdefault(self.task_key(dependency), dependency)
+            Batch.tasks = [(config_file, False) for config_file in unique.values()]
+
+        makefiles: dict[Path, ConfigFile] = {}
+        for config_file, _ in Batch.tasks:
+            other = makefiles.setdefault(self.makefile(config_file).resolve(), config_file)
+            if other is config_file:
+                continue
+            if other.base is config_file.base:
+                self.logger.error(f"`{config_file.path}` is used with different `-fPIC`, LTO or PGO settings by the projects, "
+                                  f"so `{self.makefile(config_file)}` can not serve all of them, generate them in separate runs")
+            self.logger.error(f"`{config_file.path}` and `{other.path}` would both generate `{self.makefile(config_file)}`, "
+                              "every config file needs a directory of its own")
+
+        generated: dict[tuple, list[str]] = {}
+        with self.executor() as pool:
+            for (config_file, _), outputs in zip(Batch.tasks, pool.map(self.generate, range(len(Batch.tasks)))):
+                generated[self.task_key(config_file)] = outputs
+        self.logger.info(f"generated {sum(len(outputs) for outputs in generated.values())} files for {len(stale)} projects")
+
+        for file, config_file in roots.items():
+            if self.flat:
+                outputs = generated[self.task_key(config_file)]
+            else:
+                outputs = [output for dependency in config_file.topological_order() for output in generated[self.task_key(dependency)]]
+            stamps[file].record(config_file, self.options, [Path(output) for output in outputs])
+            stamps[file].save()
+
+        if ConfigFile.source_index is not None:
+            ConfigFile.source_index.save()
+
+        return 0
+
+
 def consume_arg(arguments: list[str], target: str) -> bool:
     for argument in arguments:
         if argument == target:
@@ -502,6 +3692,28 @@ def consume_arg(arguments: list[str], target: str) -> bool:
     return False
 
 
+def consume_arg_value(arguments: list[str], target: str) -> str | None:
+    """
+    Removes `target` and the argument that follows it from `arguments`, a short option also takes its value
+    attached to it like make does (`-j4`)
+
+    :return: the argument that followed `target` or None if `target` was not given
+    """
+    if target not in arguments:
+        if len(target) == 2 and target[0] == "-" and target[1] != "-":
+            for index, argument in enumerate(arguments):
+                if argument.startswith(target) and len(argument) > 2:
+                    del arguments[index]
+                    return argument[2:]
+        return None
+    index = arguments.index(target)
+    if index + 1 >= len(arguments):
+        Logger().error(f"`{target}` expects a value")
+    value = arguments[index + 1]
+    del arguments[index:index + 2]
+    return value
+
+
 def usage(out) -> None:
     print(f"Usage: {sys.argv[0]} [config-file]", file=out)
     print("If no config file is given the default one will be used (cfg.json)", file=out)
@@ -510,14 +3722,43 @@ def usage(out) -> None:
     print("    -f --file specify the config file", file=out)
     print("    -h --help display this message", file=out)
     print("    --clean cleans up ALL the files generated by MakeMake and everything that the Makefiles have generated", file=out)
+    print("    --flat generate a single non recursive Makefile for the whole dependency graph", file=out)
+    print("    --parallel-safe generate Makefiles that are correct under make -j (mirrored build tree, order-only directories, $(MAKE))", file=out)
+    print("    --force regenerate the Makefiles even if no config file changed since the last run", file=out)
+    print("    --cache-stats [--cache-dir DIR] [--cache-max-size SIZE] [config] print the statistics of the compile cache", file=out)
+    print("    --build build the config file directly without make", file=out)
+    print("    -j --jobs N the number of parallel jobs of --build, also given as -jN (defaults to the number of CPUs)", file=out)
+    print("    --profile NAME the profile that --build uses (defaults to `cxx.default-profile`)", file=out)
+    print("    --generator make|ninja generate Makefiles (default) or a single build.ninja for the profile that --profile selects", file=out)
+    print("    --link-jobs N how many archive and link steps ninja runs at once (defaults to a quarter of the CPUs)", file=out)
+    print("    --shard i/N with --build compile only the objects of shard i of N and copy them into the artifact directory", file=out)
+    print("    --link-shards with --build take the objects of every shard from the artifact directory and only archive and link", file=out)
+    print("    --artifact-dir DIR the directory that the shards share (defaults to .MakeMake/artifacts)", file=out)
+    print("    --shard-weights FILE the compile times that split the objects, every shard must see the same (defaults to durations.json of the artifact directory)", file=out)
+    print("    --watch keep the config files in memory and regenerate the Makefiles when a config file changes", file=out)
+    print("    --watch --build | --make also rebuild after every change, with the builder of --build or with make", file=out)
+    print("    --debounce SECONDS how long --watch waits for a burst of changes to settle (default 0.2)", file=out)
+    print("    --batch CONFIG|GLOB... generate the Makefiles of many config files in one run, each next to its config file (-j sets the workers)", file=out)
+    print("    --analyze-includes [--top N] [--json] rank the headers by how much they cost the build and by how much an edit of them rebuilds", file=out)
+    print("    --timings print how long every phase of MakeMake took", file=out)
+    print("    --trace-report [--trace-file FILE] [--chrome-trace FILE] [--top N] report the recipe times that `make TRACE=1` recorded", file=out)
 
 
 def main() -> None:
     logger: Logger = Logger()
 
+    if len(sys.argv) > 1 and sys.argv[1] == "--cache-exec":
+        sys.exit(CompileCache.main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "--trace-exec":
+        sys.exit(Trace.main(sys.argv[2:]))
+
     argv = sys.argv[:]
 
     make_clean: bool = False
+    force: bool = False
+    flat: bool = False
+    build: bool = False
+    watch: bool = False
 
     if consume_arg(argv, "-h") or consume_arg(argv, "--help"):
         usage(sys.stdout)
@@ -526,9 +3767,88 @@ def main() -> None:
     if consume_arg(argv, "--silent"):
         Logger.silent = True
 
+    if consume_arg(argv, "--timings"):
+        Timings.enable()
+
+    if consume_arg(argv, "--cache-stats"):
+        directory = consume_arg_value(argv, "--cache-dir")
+        max_size = consume_arg_value(argv, "--cache-max-size")
+        CompileCache.configured(argv[1] if len(argv) > 1 else "cfg.json", directory, max_size).print_stats()
+        sys.exit(0)
+
+    if consume_arg(argv, "--trace-report"):
+        top = consume_arg_value(argv, "--top") or "20"
+        if not top.isdigit():
+            logger.error(f"`--top` must be a non negative integer, got `{top}`")
+        Trace(consume_arg_value(argv, "--trace-file")).report(int(top), consume_arg_value(argv, "--chrome-trace"))
+        sys.exit(0)
+
     if consume_arg(argv, "--clean"):
         make_clean = True
 
+    if consume_arg(argv, "--force"):
+        force = True
+
+    if consume_arg(argv, "--flat"):
+        flat = True
+
+    if consume_arg(argv, "--parallel-safe"):
+        ConfigFile.parallel_safe = True
+
+    if consume_arg(argv, "--build"):
+        build = True
+
+    if consume_arg(argv, "--watch"):
+        watch = True
+    batch = consume_arg(argv, "--batch")
+    run_make = consume_arg(argv, "--make")
+    debounce = consume_arg_value(argv, "--debounce") or "0.2"
+    try:
+        debounce = float(debounce)
+    except ValueError:
+        logger.error(f"`--debounce` must be a number of seconds, got `{debounce}`")
+
+    jobs = consume_arg_value(argv, "-j") or consume_arg_value(argv, "--jobs") or str(os.cpu_count() or 1)
+    if not jobs.isdigit() or int(jobs) < 1:
+        logger.error(f"the number of jobs must be a positive integer, got `{jobs}`")
+
+    profile = consume_arg_value(argv, "--profile")
+
+    analyze_includes = consume_arg(argv, "--analyze-includes")
+    analyze_json = consume_arg(argv, "--json")
+    top = consume_arg_value(argv, "--top") or "20"
+    if not top.isdigit():
+        logger.error(f"`--top` must be a non negative integer, got `{top}`")
+    if analyze_json:
+        # the analysis is the only thing on stdout
+        Logger.silent = True
+
+    shard = consume_arg_value(argv, "--shard")
+    link_shards = consume_arg(argv, "--link-shards")
+    artifact_directory = consume_arg_value(argv, "--artifact-dir") or str(STATE_DIR / "artifacts")
+    shard_weights = consume_arg_value(argv, "--shard-weights")
+    if (shard is not None or link_shards) and not build:
+        logger.error("--shard and --link-shards need --build")
+
+    generator = consume_arg_value(argv, "--generator") or "make"
+    if generator not in ("make", "ninja"):
+        logger.error(f"unknown generator `{generator}`, expected `make` or `ninja`")
+    link_jobs = consume_arg_value(argv, "--link-jobs") or str(max(1, (os.cpu_count() or 1) // 4))
+    if not link_jobs.isdigit() or int(link_jobs) < 1:
+        logger.error(f"the number of link jobs must be a positive integer, got `{link_jobs}`")
+
+    if batch:
+        if watch or build or make_clean or generator != "make":
+            logger.error("--batch only generates Makefiles, it can not be combined with --watch, --build, --clean or --generator")
+        if len(argv) < 2:
+            logger.error("--batch expects config files or glob patterns")
+        batch_options = ["--flat"] if flat else []
+        if ConfigFile.parallel_safe:
+            batch_options.append("--parallel-safe")
+        code = Batch(argv[1:], batch_options, flat, int(jobs), force).run()
+        Timings.print_report()
+        sys.exit(code)
+
     file: str
     if len(argv) < 2:
         logger.info("No config file specified, using default")
@@ -556,6 +3876,63 @@ def main() -> None:
 
     logger.info(f"Using config file `{file}`")
 
+    options: list[str] = []
+    if flat:
+        options.append("--flat")
+    if ConfigFile.parallel_safe:
+        options.append("--parallel-safe")
+    if generator == "ninja":
+        options += ["--generator", "ninja", "--link-jobs", link_jobs]
+        if profile is not None:
+            options += ["--profile", profile]
+
+    if watch:
+        rebuild = "build" if build else "make" if run_make else None
+        sys.exit(Watcher(file, options, flat, rebuild, int(jobs), profile, debounce).run())
+
+    if analyze_includes:
+        config_file = ConfigFile(file)
+        config_file.parse()
+
+        ConfigFile.profile = profile or config_file.default_profile
+        builder = Builder(config_file, 1, ConfigFile.profile)
+        builder.load_state()
+        durations = {output: state["duration"] for output, state in builder.state.items() if "duration" in state}
+        IncludeGraph(config_file).report(int(top), analyze_json, durations)
+
+        if ConfigFile.source_index is not None:
+            ConfigFile.source_index.save()
+        sys.exit(0)
+
+    if build:
+        config_file = ConfigFile(file)
+        config_file.parse()
+
+        ConfigFile.profile = profile or config_file.default_profile
+        builder = Builder(config_file, int(jobs), ConfigFile.profile)
+        with Timings.phase("build"):
+            if shard is not None:
+                code = Shard(builder, artifact_directory, shard_weights).build(*Shard.parse(shard))
+            elif link_shards:
+                code = Shard(builder, artifact_directory, shard_weights).link()
+            else:
+                code = builder.run()
+
+        if ConfigFile.source_index is not None:
+            ConfigFile.source_index.save()
+        Timings.print_report()
+        sys.exit(code)
+
+    stamp: Stamp = Stamp()
+    if not make_clean and not force:
+        with Timings.phase("stamp"):
+            stamp.load()
+            up_to_date = stamp.is_up_to_date(file, options)
+        if up_to_date:
+            logger.info("no config file changed since the last run, nothing to do")
+            Timings.print_report()
+            sys.exit(0)
+
     config_file: ConfigFile = ConfigFile(file)
 
     config_file.parse()
@@ -566,7 +3943,23 @@ def main() -> None:
         logger.info("done")
         sys.exit(0)
 
-    config_file.make("./Makefile")
+    if generator == "ninja":
+        # ninja has no variables that are set when it runs, the profile is selected when the file is generated
+        ConfigFile.profile = profile or config_file.default_profile
+        outputs = config_file.make_ninja("build.ninja", int(link_jobs), ["--silent"] + options + [file])
+    elif flat:
+        outputs = config_file.make_flat("./Makefile")
+    else:
+        outputs = config_file.make("./Makefile")
+
+    with Timings.phase("stamp"):
+        stamp.record(config_file, options, outputs)
+        stamp.save()
+
+    if ConfigFile.source_index is not None:
+        ConfigFile.source_index.save()
+
+    Timings.print_report()
 
 
 if __name__ == "__main__":
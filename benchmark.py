@@ -0,0 +1,438 @@
+from pathlib import Path
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import MakeMake
+from MakeMake import ConfigFile, Logger, Stamp, Timings, consume_arg, consume_arg_value
+
+
+# the methods of ConfigFile that are timed, every one of them is a phase of `ConfigFile.parse` or `ConfigFile.make`
+PARSE_PHASES: list[str] = [
+    "read_json",
+    "parse_globals",
+    "register_section_globals",
+    "parse_settings",
+    "parse_executable",
+    "parse_archive",
+    "parse_cxx",
+    "parse_include_directories",
+    "parse_library_directories",
+    "parse_libraries",
+    "parse_source_files",
+    "parse_directories_to_create",
+    "parse_dependencies",
+]
+MAKE_PHASES: list[str] = [
+    "topological_order",
+    "make_profile_selection",
+    "make_variables",
+    "make_executable_rule",
+    "make_archive_rule",
+    "make_object_rules",
+    "make_directory_rules",
+    "write_unity_files",
+    "write_file",
+]
+
+
+class PhaseTimer:
+    """
+    Makes methods of a class phases of `Timings` named after the method, a method that MakeMake already times
+    is timed under its own name instead. `Timings` charges every phase only for its own time, so
+    `parse_dependencies` does not include the parsing of the dependencies
+    """
+
+    def __init__(self) -> None:
+        self.originals: list[tuple[type, str, object]] = []
+
+    def wrap(self, cls: type, name: str) -> None:
+        original = cls.__dict__[name]
+        is_static = isinstance(original, staticmethod)
+        function = original.__func__ if is_static else original
+        timed = Timings.timed(name)(getattr(function, "__wrapped__", function))
+
+        self.originals.append((cls, name, original))
+        setattr(cls, name, staticmethod(timed) if is_static else timed)
+
+    def restore(self) -> None:
+        for cls, name, original in reversed(self.originals):
+            setattr(cls, name, original)
+        self.originals.clear()
+        Timings.reset()
+
+    @staticmethod
+    def measure(step, phases: dict[str, dict[str, float | int]]) -> float:
+        """
+        Runs `step` with `Timings` enabled and adds the calls and the time of every phase that it ran to `phases`
+
+        :return: how long `step` took
+        """
+        Timings.reset()
+        Timings.enable()
+        start = time.perf_counter()
+        step()
+        elapsed = time.perf_counter() - start
+        for phase, seconds in Timings.seconds.items():
+            totals = phases.setdefault(phase, {"calls": 0, "seconds": 0.0})
+            totals["calls"] += Timings.calls[phase]
+            totals["seconds"] += seconds
+        Timings.reset()
+        return elapsed
+
+
+class Project:
+    """
+    A synthetic project: an executable that depends on a graph of archives
+
+    The archives form `depth` levels under the executable and every config file depends on `fan-out` archives
+    of the next level. With `diamond` the archives of a level are shared by every config file of the level above,
+    otherwise every config file gets archives of its own and the graph is a tree
+    """
+
+    def __init__(self, root: Path, sources: int, globals_: int, depth: int, fan_out: int, diamond: bool) -> None:
+        self.root: Path = root
+        self.sources: int = sources
+        self.globals: int = globals_
+        self.depth: int = depth
+        self.fan_out: int = fan_out
+        self.diamond: bool = diamond
+
+        # the archives of every level, the executable is not included
+        self.levels: list[list[str]] = []
+        # the archives that every config file depends on
+        self.dependencies: dict[str, list[str]] = {"app": []}
+
+        parents = ["app"]
+        for level in range(1, self.depth + 1):
+            archives: list[str] = []
+            for parent_index, parent in enumerate(parents):
+                for child in range(self.fan_out):
+                    name = f"l{level}_{child}" if self.diamond else f"l{level}_{parent_index * self.fan_out + child}"
+                    if name not in archives:
+                        archives.append(name)
+                    self.dependencies[parent].append(name)
+                    self.dependencies.setdefault(name, [])
+            self.levels.append(archives)
+            parents = archives
+
+    def config_files(self) -> list[str]:
+        return list(self.dependencies.keys())
+
+    def source_count(self, name: str) -> int:
+        """
+        :return: how many of the source files of the project belong to the config file `name`
+        """
+        names = self.config_files()
+        count, remainder = divmod(self.sources, len(names))
+        return max(1, count + (1 if names.index(name) < remainder else 0))
+
+    def directory(self, name: str) -> str:
+        return "." if name == "app" else f"libraries/{name}"
+
+    def make_globals(self, name: str) -> dict[str, str]:
+        """
+        Globals that reference each other so resolving them is not free
+        """
+        globals_: dict[str, str] = {"root": self.directory(name)}
+        for index in range(self.globals):
+            globals_[f"g{index}"] = f"$(root)/g{index}" if index == 0 else f"$(g{index - 1})/g{index}"
+        return globals_
+
+    def make_config(self, name: str) -> dict:
+        directory = self.directory(name)
+        config = {
+            "globals": self.make_globals(name),
+            "settings": {"src-c-dir": f"{directory}/src/", "src-cpp-dir": f"{directory}/src/", "out-type": "executable", "libraries-dir": "libs"},
+            "cxx": {
+                "standard": "17",
+                "compiler": "g++",
+                "build-dir": f"{directory}/build/",
+                "flags": ["-Wall"] + ([f"-DLAST_GLOBAL=$(g{self.globals - 1})"] if self.globals > 0 else []),
+                "debug-flags": ["-g"],
+                "release-flags": ["-O2"],
+            },
+            "include-dirs": [f"{directory}/include", "common/include"],
+            "source-files": [f"{directory}/src/{name}_{index}.cpp" for index in range(self.source_count(name))],
+            "directories-to-create": [f"{directory}/build/"],
+        }
+
+        if name == "app":
+            config["executable"] = {"name": "app"}
+            config["directories-to-create"].append("libs/")
+        else:
+            config["settings"]["out-type"] = "archive"
+            config["archive"] = {"name": f"$(libdir)/{name}"}
+
+        if len(self.dependencies[name]) > 0:
+            config["dependencies"] = {
+                f"{self.directory(dependency)}/cfg.json": {"globals": {"libdir": "libs"}}
+                for dependency in self.dependencies[name]
+            }
+
+        return config
+
+    def write(self) -> None:
+        (self.root / "common" / "include").mkdir(parents=True, exist_ok=True)
+        (self.root / "common" / "include" / "common.hpp").write_text("#pragma once\n\ninline int common_value() { return 1; }\n")
+
+        for name in self.config_files():
+            directory = self.root / self.directory(name)
+            (directory / "src").mkdir(parents=True, exist_ok=True)
+            (directory / "include").mkdir(parents=True, exist_ok=True)
+            (directory / "include" / f"{name}.hpp").write_text(f"#pragma once\n\nint {name}_value();\n")
+
+            for index in range(self.source_count(name)):
+                content = f"#include \"common.hpp\"\n#include \"{name}.hpp\"\n\n"
+                if name == "app" and index == 0:
+                    content += "int main() { return common_value() - 1; }\n"
+                else:
+                    content += f"int {name}_{index}() {{ return common_value() + {index}; }}\n"
+                (directory / "src" / f"{name}_{index}.cpp").write_text(content)
+
+            with open(directory / "cfg.json", "w") as f:
+                json.dump(self.make_config(name), f, indent=4)
+
+    def deepest_source(self) -> Path:
+        name = self.levels[-1][-1] if len(self.levels) > 0 else "app"
+        return self.root / self.directory(name) / "src" / f"{name}_0.cpp"
+
+    def header(self) -> Path:
+        return self.root / "common" / "include" / "common.hpp"
+
+    def shape(self) -> dict[str, int | bool]:
+        return {
+            "sources": self.sources,
+            "globals": self.globals,
+            "depth": self.depth,
+            "fan-out": self.fan_out,
+            "diamond": self.diamond,
+            "config-files": len(self.config_files()),
+        }
+
+
+def reset_config_file_state() -> None:
+    ConfigFile.parsed.clear()
+    ConfigFile.parsing.clear()
+    ConfigFile.source_index = None
+
+
+def summarize(samples: list[float]) -> dict[str, float | list[float]]:
+    return {"min": min(samples), "median": statistics.median(samples), "max": max(samples), "samples": samples}
+
+
+def time_generator(project: Project, flat: bool, repeat: int) -> dict:
+    """
+    Parses the config file of the project and generates its Makefiles `repeat` times in this process
+
+    :return: the total parse and make times and the average time of every phase
+    """
+    timer = PhaseTimer()
+    for name in PARSE_PHASES + MAKE_PHASES:
+        timer.wrap(ConfigFile, name)
+
+    parse_samples: list[float] = []
+    make_samples: list[float] = []
+    parse_phases: dict = {}
+    make_phases: dict = {}
+    try:
+        for _ in range(repeat):
+            reset_config_file_state()
+            config_file = ConfigFile("cfg.json")
+            parse_samples.append(timer.measure(config_file.parse, parse_phases))
+            make = config_file.make_flat if flat else config_file.make
+            make_samples.append(timer.measure(lambda: make("./Makefile"), make_phases))
+    finally:
+        timer.restore()
+        reset_config_file_state()
+
+    for phases in (parse_phases, make_phases):
+        for phase in phases.values():
+            phase["calls"] //= repeat
+            phase["seconds"] /= repeat
+
+    return {
+        "parse": {"seconds": summarize(parse_samples), "phases": parse_phases},
+        "make": {"seconds": summarize(make_samples), "phases": make_phases},
+    }
+
+
+def run_make(arguments: list[str], check: bool=True) -> float:
+    start = time.perf_counter()
+    result = subprocess.run(["make", *arguments], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    elapsed = time.perf_counter() - start
+    if check and result.returncode != 0:
+        Logger().error(f"`make {' '.join(arguments)}` failed:\n{result.stderr.decode(errors='replace')}")
+    return elapsed
+
+
+def time_makefiles(project: Project, jobs: int, repeat: int) -> dict:
+    """
+    Builds the project once and times the no-op runs of the generated Makefiles
+    and the incremental rebuilds after touching one source file or the header that every source file includes
+    """
+    arguments = [f"-j{jobs}"]
+
+    results: dict = {"build": run_make(arguments)}
+
+    # `make -q` exits with 1 when something is out of date, it is not an error here
+    results["noop-question"] = summarize([run_make(["-q"], check=False) for _ in range(repeat)])
+    results["noop-dry-run"] = summarize([run_make(["-n"]) for _ in range(repeat)])
+    results["noop"] = summarize([run_make(arguments) for _ in range(repeat)])
+
+    touch_source: list[float] = []
+    touch_header: list[float] = []
+    for _ in range(repeat):
+        project.deepest_source().touch()
+        touch_source.append(run_make(arguments))
+        project.header().touch()
+        touch_header.append(run_make(arguments))
+    results["touch-source"] = summarize(touch_source)
+    results["touch-header"] = summarize(touch_header)
+
+    return results
+
+
+def git_revision() -> str | None:
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=Path(MakeMake.__file__).parent, capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def compare(results: dict, baseline_path: str) -> None:
+    """
+    Prints how the median times of `results` changed since the results in `baseline_path`
+    """
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+
+    def medians(data: dict, prefix: str="") -> dict[str, float]:
+        values: dict[str, float] = {}
+        for key, value in data.items():
+            if not isinstance(value, dict):
+                continue
+            if "median" in value:
+                values[f"{prefix}{key}"] = value["median"]
+            else:
+                values.update(medians(value, f"{prefix}{key}."))
+        return values
+
+    old = medians(baseline)
+    for key, value in medians(results).items():
+        if key not in old or old[key] == 0:
+            continue
+        print(f"{key:40} {old[key]:10.4f}s -> {value:10.4f}s ({value / old[key] - 1:+.1%})")
+
+
+def usage(out) -> None:
+    print(f"Usage: {sys.argv[0]} [options]", file=out)
+    print("Generates a synthetic project, times MakeMake on it and the Makefiles that it generated", file=out)
+    print("    --sources N the number of source files of the whole project (default 200)", file=out)
+    print("    --globals N the number of globals of every config file (default 20)", file=out)
+    print("    --depth N the number of archive levels under the executable (default 2)", file=out)
+    print("    --fan-out N the number of archives that every config file depends on (default 3)", file=out)
+    print("    --diamond share the archives of a level between every config file of the level above", file=out)
+    print("    --recursive time the recursive Makefiles instead of the flat one", file=out)
+    print("    --repeat N how many times every measurement is taken (default 5)", file=out)
+    print("    -j --jobs N the number of jobs of make (defaults to the number of CPUs)", file=out)
+    print("    --no-make only time MakeMake and skip make", file=out)
+    print("    --directory DIR where the project is generated, it is kept afterwards (defaults to a temporary directory)", file=out)
+    print("    --output FILE where the results are saved (default benchmark.json)", file=out)
+    print("    --compare FILE print the changes since the results saved in FILE", file=out)
+    print("    -h --help display this message", file=out)
+
+
+def main() -> None:
+    logger: Logger = Logger()
+    argv = sys.argv[:]
+
+    if consume_arg(argv, "-h") or consume_arg(argv, "--help"):
+        usage(sys.stdout)
+        sys.exit(0)
+
+    numbers: dict[str, int] = {}
+    for option, default in (("--sources", 200), ("--globals", 20), ("--depth", 2), ("--fan-out", 3), ("--repeat", 5)):
+        value = consume_arg_value(argv, option) or str(default)
+        if not value.isdigit():
+            logger.error(f"`{option}` must be a non negative integer, got `{value}`")
+        numbers[option] = int(value)
+    if numbers["--repeat"] < 1:
+        logger.error("`--repeat` must be at least 1")
+
+    jobs = consume_arg_value(argv, "-j") or consume_arg_value(argv, "--jobs") or str(os.cpu_count() or 1)
+    if not jobs.isdigit() or int(jobs) < 1:
+        logger.error(f"the number of jobs must be a positive integer, got `{jobs}`")
+
+    diamond = consume_arg(argv, "--diamond")
+    flat = not consume_arg(argv, "--recursive")
+    no_make = consume_arg(argv, "--no-make")
+    directory = consume_arg_value(argv, "--directory")
+    output = consume_arg_value(argv, "--output") or "benchmark.json"
+    baseline = consume_arg_value(argv, "--compare")
+
+    if len(argv) > 1:
+        logger.error(f"unknown arguments: {' '.join(argv[1:])}", 0)
+        usage(sys.stderr)
+        sys.exit(1)
+
+    if not no_make and shutil.which("make") is None:
+        logger.error("make was not found, use --no-make to time only MakeMake")
+
+    root = Path(directory) if directory is not None else Path(tempfile.mkdtemp(prefix="MakeMake-benchmark-"))
+    if root.exists() and any(root.iterdir()):
+        logger.error(f"`{root}` is not empty")
+
+    output = str(Path(output).resolve())
+    baseline = str(Path(baseline).resolve()) if baseline is not None else None
+
+    project = Project(root, numbers["--sources"], numbers["--globals"], numbers["--depth"], numbers["--fan-out"], diamond)
+    logger.info(f"generating a project with {len(project.config_files())} config files and {project.sources} source files in `{root}`")
+    project.write()
+
+    results: dict = {
+        "generator-version": Stamp.generator_version(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "shape": project.shape(),
+        "flat": flat,
+        "repeat": numbers["--repeat"],
+        "jobs": int(jobs),
+    }
+
+    working_directory = os.getcwd()
+    silent = Logger.silent
+    os.chdir(root)
+    try:
+        Logger.silent = True
+        results["generator"] = time_generator(project, flat, numbers["--repeat"])
+        Logger.silent = silent
+        if not no_make:
+            logger.info("building the project...")
+            results["makefiles"] = time_makefiles(project, int(jobs), numbers["--repeat"])
+    finally:
+        Logger.silent = silent
+        os.chdir(working_directory)
+        if directory is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=4)
+    logger.info(f"results were saved in `{output}`")
+
+    if baseline is not None:
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+from pathlib import Path
+import json
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from MakeMake import ConfigFile, Logger, Timings
+
+
+requires_toolchain = pytest.mark.skipif(shutil.which("g++") is None or shutil.which("make") is None,
+                                        reason="needs g++ and make")
+
+
+def reset_state() -> None:
+    ConfigFile.parsed.clear()
+    ConfigFile.parsing.clear()
+    ConfigFile.parallel_safe = False
+    ConfigFile.source_index = None
+    ConfigFile.profile = "$(PROFILE)$(UNITY_SUFFIX)"
+    Timings.reset()
+
+
+class Project:
+    """
+    A project in a temporary directory, the config files are written with `archive` and `executable`
+    and MakeMake runs either in this process with `parse` or as a command with `run`
+    """
+    def __init__(self, root: Path) -> None:
+        self.root: Path = root
+
+    def write(self, path: str, content: str) -> Path:
+        path = self.root / path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+        return path
+
+    def config(self, path: str, data: dict) -> Path:
+        return self.write(path, json.dumps(data, indent=4))
+
+    def executable(self, sources: dict[str, str], dependencies: list[str] | None=None, path: str="cfg.json", **sections) -> Path:
+        """
+        Writes the sources and the config file of the executable `app`, built in `build/`
+
+        :param sources: the content of every source file by its path
+        :param dependencies: the config files of the archives that the executable links
+        :param sections: sections that are added to the config file or replace its sections
+        """
+        for source, content in sources.items():
+            self.write(source, content)
+        data = {
+            "settings": {"src-c-dir": "src/", "src-cpp-dir": "src/", "out-type": "executable", "libraries-dir": "libs"},
+            "executable": {"name": "app"},
+            "cxx": {"standard": "17", "compiler": "g++", "build-dir": "build/", "flags": [], "debug-flags": [], "release-flags": []},
+            "include-dirs": ["include"],
+            "source-files": list(sources),
+            "directories-to-create": ["build/", "libs/"],
+        }
+        if dependencies is not None:
+            data["dependencies"] = {dependency: {"globals": {}} for dependency in dependencies}
+        data.update(sections)
+        return self.config(path, data)
+
+    def archive(self, name: str, sources: dict[str, str], dependencies: list[str] | None=None) -> str:
+        """
+        Writes the sources and the config file of the archive `libs/<name>`, its sources live in `<name>/src/`
+
+        :return: the path of the config file
+        """
+        for source, content in sources.items():
+            self.write(f"{name}/src/{source}", content)
+        data = {
+            "settings": {"src-c-dir": f"{name}/src/", "src-cpp-dir": f"{name}/src/", "out-type": "archive", "libraries-dir": "libs"},
+            "archive": {"name": f"libs/{name}"},
+            "cxx": {"standard": "17", "compiler": "g++", "build-dir": f"{name}/build/", "flags": [], "debug-flags": [], "release-flags": []},
+            "source-files": [f"{name}/src/{source}" for source in sources],
+            "directories-to-create": [f"{name}/build/"],
+        }
+        if dependencies is not None:
+            data["dependencies"] = {dependency: {"globals": {}} for dependency in dependencies}
+        self.config(f"{name}/cfg.json", data)
+        return f"{name}/cfg.json"
+
+    def parse(self, path: str="cfg.json") -> ConfigFile:
+        reset_state()
+        config_file = ConfigFile(path)
+        config_file.parse()
+        return config_file
+
+    def run(self, *arguments: str, check: bool=True) -> subprocess.CompletedProcess:
+        result = subprocess.run([sys.executable, str(ROOT / "MakeMake.py"), *arguments], cwd=self.root, capture_output=True, text=True)
+        if check and result.returncode != 0:
+            raise AssertionError(f"MakeMake {' '.join(arguments)} failed:\n{result.stdout}\n{result.stderr}")
+        return result
+
+    def make(self, *arguments: str, check: bool=True) -> subprocess.CompletedProcess:
+        result = subprocess.run(["make", *arguments], cwd=self.root, capture_output=True, text=True)
+        if check and result.returncode != 0:
+            raise AssertionError(f"make {' '.join(arguments)} failed:\n{result.stdout}\n{result.stderr}")
+        return result
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Logger, "silent", True)
+    reset_state()
+    yield Project(tmp_path)
+    reset_state()
@@ -0,0 +1,63 @@
+import pytest
+
+from MakeMake import consume_arg_value
+from conftest import requires_toolchain
+
+
+@pytest.mark.parametrize("arguments", [["MakeMake.py", "-j", "4", "cfg.json"], ["MakeMake.py", "-j4", "cfg.json"]])
+def test_jobs_are_given_like_make_takes_them(arguments):
+    assert consume_arg_value(arguments, "-j") == "4"
+    assert arguments == ["MakeMake.py", "cfg.json"]
+
+
+def test_a_long_option_needs_a_separate_value():
+    arguments = ["MakeMake.py", "--jobs4"]
+    assert consume_arg_value(arguments, "--jobs") is None
+    assert arguments == ["MakeMake.py", "--jobs4"]
+
+
+@requires_toolchain
+def test_build_with_attached_jobs(project):
+    project.executable({"src/main.cpp": "int f();\nint main() { return f(); }\n", "src/f.cpp": "int f() { return 0; }\n"})
+    project.run("--build", "-j4")
+
+    assert (project.root / "debug" / "app").exists()
+
+
+PROFILE_CHECK = "#ifndef PROFILE_debug\n#error the profile was not expanded\n#endif\nint main() { return 0; }\n"
+
+
+def cxx(*flags: str) -> dict:
+    return {"standard": "17", "compiler": "g++", "build-dir": "build/", "flags": list(flags), "debug-flags": [], "release-flags": []}
+
+
+def test_builder_expands_the_makefile_and_environment_variables(project, monkeypatch):
+    monkeypatch.setenv("EXTRA_DEFINE", "FROM_ENVIRONMENT")
+    project.executable({"src/main.cpp": PROFILE_CHECK}, cxx=cxx("-DPROFILE_$(PROFILE)", "-D$(EXTRA_DEFINE)", "-DSUFFIX=x$(UNITY_SUFFIX)"))
+    config_file = project.parse()
+
+    arguments = config_file.compile_arguments("debug")
+
+    assert "-DPROFILE_debug" in arguments
+    assert "-DFROM_ENVIRONMENT" in arguments
+    assert "-DSUFFIX=x" in arguments
+
+
+def test_builder_rejects_variables_that_only_make_knows(project):
+    project.executable({"src/main.cpp": PROFILE_CHECK}, cxx=cxx("$(MAKEMAKE_SURELY_UNDEFINED)"))
+
+    result = project.run("--build", check=False)
+
+    assert result.returncode != 0
+    assert "`$(MAKEMAKE_SURELY_UNDEFINED)`" in result.stdout + result.stderr
+
+
+@requires_toolchain
+@pytest.mark.parametrize("arguments", [["--build"], []])
+def test_builder_and_make_compile_the_same_flags(project, arguments):
+    project.executable({"src/main.cpp": PROFILE_CHECK}, cxx=cxx("-DPROFILE_$(PROFILE)"))
+    project.run(*arguments)
+    if len(arguments) == 0:
+        project.make()
+
+    assert (project.root / "debug" / "app").exists()
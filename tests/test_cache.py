@@ -0,0 +1,54 @@
+import json
+import shutil
+
+from MakeMake import CompileCache
+from conftest import requires_toolchain
+
+
+def test_compile_job_recognizes_only_compilations():
+    assert CompileCache.compile_job(["g++", "-MMD", "-c", "-o", "a.o", "a.cpp"]) == ("a.cpp", "a.o")
+    assert CompileCache.compile_job(["g++", "-o", "app", "a.o", "b.o"]) == (None, None)
+    assert CompileCache.compile_job(["g++", "-c", "-fprofile-use", "-o", "a.o", "a.cpp"]) == (None, None)
+    assert CompileCache.compile_job(["g++", "-x", "c++-header", "-c", "-o", "pch.hpp.gch", "pch.hpp"]) == (None, None)
+
+
+def cached_project(project) -> None:
+    project.executable({
+        "src/main.cpp": "int value();\nint main() { return value() == 1 ? 0 : 1; }\n",
+        "src/value.cpp": "int value() { return 1; }\n",
+    }, cxx={"standard": "17", "compiler": "g++", "build-dir": "build/", "flags": [], "debug-flags": [], "release-flags": [],
+            "compile-cache": {"directory": "cache", "max-size": "64M"}})
+    project.run()
+
+
+def stats(project) -> dict[str, int]:
+    return json.loads((project.root / "cache" / "stats.json").read_text())
+
+
+@requires_toolchain
+def test_clean_build_is_served_from_the_cache(project):
+    cached_project(project)
+
+    project.make()
+    assert (stats(project)["hits"], stats(project)["misses"]) == (0, 2)
+
+    shutil.rmtree(project.root / "build")
+    shutil.rmtree(project.root / "debug")
+    project.make()
+
+    assert (stats(project)["hits"], stats(project)["misses"]) == (2, 2)
+    assert (project.root / "build" / "debug" / "value.cpp.d").exists()
+    assert project.make("-q", check=False).returncode == 0
+    assert "hits             2" in project.run("--cache-stats").stdout
+
+
+@requires_toolchain
+def test_changed_source_misses_the_cache(project):
+    cached_project(project)
+    project.make()
+
+    project.write("src/value.cpp", "int value() { return 2 - 1; }\n")
+    shutil.rmtree(project.root / "build")
+    project.make()
+
+    assert (stats(project)["hits"], stats(project)["misses"]) == (1, 3)
@@ -0,0 +1,54 @@
+from conftest import requires_toolchain
+
+
+def diamond(project) -> None:
+    """
+    `app` uses `b` and `c` which both use `d`
+    """
+    d = project.archive("d", {"d.cpp": "int d() { return 1; }\n"})
+    b = project.archive("b", {"b.cpp": "int d();\nint b() { return d() + 1; }\n"}, [d])
+    c = project.archive("c", {"c.cpp": "int d();\nint c() { return d() + 2; }\n"}, [d])
+    project.executable({"src/main.cpp": "int b();\nint c();\nint main() { return b() + c() == 5 ? 0 : 1; }\n"}, [b, c])
+
+
+def test_shared_dependency_is_parsed_once(project):
+    diamond(project)
+
+    config_file = project.parse()
+    b = config_file.dependencies_config_files["b/cfg.json"]
+    c = config_file.dependencies_config_files["c/cfg.json"]
+
+    assert b.dependencies_config_files["d/cfg.json"] is c.dependencies_config_files["d/cfg.json"]
+
+
+def test_flat_makefile_has_every_dependency_once(project):
+    diamond(project)
+    project.run("--flat")
+
+    makefile = (project.root / "Makefile").read_text()
+
+    assert makefile.count("libs/$(PROFILE)$(UNITY_SUFFIX)/libd.a: ") == 1
+    assert makefile.count("d/build/$(PROFILE)$(UNITY_SUFFIX)/d.cpp.o") == 1
+
+
+@requires_toolchain
+def test_flat_makefile_links_the_diamond(project):
+    diamond(project)
+    project.run("--flat")
+
+    project.make("-j4")
+
+    assert project.make("-q", check=False).returncode == 0
+    assert (project.root / "debug" / "app").exists()
+
+
+def test_dependency_cycle_is_an_error(project):
+    a = project.archive("a", {"a.cpp": "int a() { return 1; }\n"}, ["b/cfg.json"])
+    project.archive("b", {"b.cpp": "int b() { return 1; }\n"}, [a])
+    project.executable({"src/main.cpp": "int main() { return 0; }\n"}, [a])
+
+    result = project.run(check=False)
+
+    assert result.returncode != 0
+    assert "dependency cycle detected" in result.stdout + result.stderr
+    assert not (project.root / "Makefile").exists()
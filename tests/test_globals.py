@@ -0,0 +1,85 @@
+import pytest
+
+from MakeMake import ConfigFile
+
+
+def test_globals_resolve_in_any_order(project):
+    project.executable({"src/main.cpp": "int main() { return 0; }\n"},
+                       globals={"out": "$(base)/bin", "base": "$(settings.libraries-dir)/x"},
+                       executable={"name": "$(out)/app"})
+    config_file = project.parse()
+
+    assert config_file.executable_name == "libs/x/bin/app"
+
+
+def test_a_new_definition_only_drops_the_globals_that_used_it(project):
+    config_file = ConfigFile("cfg.json")
+    config_file.add_global("a", "a")
+    config_file.add_global("b", "$(a)/b")
+    config_file.add_global("c", "c")
+    assert config_file.resolved_globals() == {"a": "a", "b": "a/b", "c": "c"}
+
+    config_file.add_global("d", "$(c)/d")
+    assert set(config_file.globals) == {"a", "b", "c"}
+
+    config_file.add_global("a", "z")
+    assert set(config_file.globals) == {"c"}
+    assert config_file.resolve_global("b") == "z/b"
+
+
+def test_a_global_that_is_defined_later_is_used(project):
+    config_file = ConfigFile("cfg.json")
+    config_file.add_global("b", "$(a)/b")
+    assert config_file.resolve_global("b") == "$(a)/b"
+
+    config_file.add_global("a", "a")
+    assert config_file.resolve_global("b") == "a/b"
+
+
+def test_every_global_is_resolved_once_per_parse(project, monkeypatch):
+    globals_ = {"g0": "$(settings.libraries-dir)"}
+    globals_.update({f"g{index}": f"$(g{index - 1})/{index}" for index in range(1, 20)})
+    project.executable({"src/main.cpp": "int main() { return 0; }\n"}, globals=globals_,
+                       cxx={"standard": "17", "compiler": "g++", "build-dir": "build/", "flags": ["-DOUT=$(g19)"],
+                            "debug-flags": [], "release-flags": []})
+
+    resolved: list[str] = []
+    substitute_globals = ConfigFile.substitute_globals
+
+    def counted(self, text, section, chain):
+        if len(chain) > 0:
+            resolved.append(chain[-1])
+        return substitute_globals(self, text, section, chain)
+
+    monkeypatch.setattr(ConfigFile, "substitute_globals", counted)
+    project.parse()
+
+    assert sorted(resolved) == sorted(set(resolved))
+
+
+@pytest.mark.parametrize("used", [True, False])
+def test_a_reference_cycle_stops_before_anything_is_written(project, used):
+    flags = ["-DX=$(x)"] if used else []
+    project.executable({"src/main.cpp": "int main() { return 0; }\n"}, globals={"x": "$(y)", "y": "$(x)"},
+                       cxx={"standard": "17", "compiler": "g++", "build-dir": "build/", "flags": flags,
+                            "debug-flags": [], "release-flags": []})
+
+    result = project.run(check=False)
+
+    assert result.returncode != 0
+    assert "$(x) -> $(y) -> $(x)" in result.stdout + result.stderr
+    assert not (project.root / "Makefile").exists()
+    assert not (project.root / ".MakeMake" / "stamp.json").exists()
+
+
+def test_make_variables_are_left_to_make_without_a_warning(project, monkeypatch):
+    project.executable({"src/main.cpp": "int main() { return 0; }\n"},
+                       cxx={"standard": "17", "compiler": "g++", "build-dir": "build/", "flags": ["-DX=$(PROFILE)", "$(CPPFLAGS)"],
+                            "debug-flags": [], "release-flags": ["-DY=$(settings.missing)"]})
+    warnings: list[str] = []
+    config_file = ConfigFile("cfg.json")
+    monkeypatch.setattr(config_file.logger, "warn", warnings.append)
+    config_file.parse()
+
+    assert "-DX=$(PROFILE) $(CPPFLAGS)" in config_file.cxx["flags"]
+    assert warnings == ["undefined global `$(settings.missing)` in section `cxx` is left as it is"]
@@ -0,0 +1,56 @@
+import os
+
+from conftest import requires_toolchain
+
+pytestmark = requires_toolchain
+
+
+def touch_later(path) -> None:
+    """
+    Moves the mtime of `path` past every file that was built, so make sees the change even on a coarse clock
+    """
+    mtime = path.stat().st_mtime_ns + 10 ** 9
+    for root, _, files in os.walk(path.parent.parent):
+        for file in files:
+            mtime = max(mtime, os.stat(os.path.join(root, file)).st_mtime_ns + 10 ** 9)
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_header_change_rebuilds_only_its_includers(project):
+    header = project.write("include/value.hpp", "#pragma once\nconstexpr int value = 1;\n")
+    project.executable({
+        "src/main.cpp": "int other();\nint uses();\nint main() { return uses() + other() == 3 ? 0 : 1; }\n",
+        "src/uses.cpp": "#include \"value.hpp\"\nint uses() { return value; }\n",
+        "src/other.cpp": "int other() { return 2; }\n",
+    })
+    project.run()
+    project.make()
+    assert project.make("-q", check=False).returncode == 0
+
+    header.write_text("#pragma once\nconstexpr int value = 2;\n")
+    touch_later(header)
+    assert project.make("-q", check=False).returncode != 0
+
+    rebuilt = project.make().stdout
+
+    assert "-c -o build/debug/uses.cpp.o" in rebuilt
+    assert "-c -o build/debug/other.cpp.o" not in rebuilt
+    assert "-c -o build/debug/main.cpp.o" not in rebuilt
+    assert "-o debug/app" in rebuilt
+
+
+def test_builder_reads_the_depfiles(project):
+    header = project.write("include/value.hpp", "#pragma once\nconstexpr int value = 1;\n")
+    project.executable({
+        "src/main.cpp": "int uses();\nint main() { return uses() == 1 ? 0 : 1; }\n",
+        "src/uses.cpp": "#include \"value.hpp\"\nint uses() { return value; }\n",
+    })
+    project.run("--build")
+    assert "`debug/app` is up to date" in project.run("--build").stdout
+
+    header.write_text("#pragma once\nconstexpr int value = 2;\n")
+    touch_later(header)
+    rebuilt = project.run("--build").stdout
+
+    assert "-c -o build/debug/uses.cpp.o" in rebuilt
+    assert "-c -o build/debug/main.cpp.o" not in rebuilt
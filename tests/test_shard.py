@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from MakeMake import Builder, Shard
+from conftest import requires_toolchain
+
+
+def sources(count: int) -> dict[str, str]:
+    files = {"src/main.cpp": "int main() { return 0; }\n"}
+    for index in range(count):
+        files[f"src/f{index}.cpp"] = f"int f{index}() {{ return {index}; }}\n" + "// padding\n" * index
+    return files
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 5])
+def test_shards_cover_every_object_once(project, count):
+    project.executable(sources(7), [project.archive("lib", {"a.cpp": "int a() { return 1; }\n", "b.cpp": "int b() { return 2; }\n"})])
+    config_file = project.parse()
+    builder = Builder(config_file, 1, config_file.default_profile)
+    objects = [job for job in builder.plan() if job.output.suffix == ".o"]
+
+    assigned = [job.output for index in range(count) for job in Shard(builder, ".MakeMake/artifacts").assign(objects, count)[index]]
+
+    assert sorted(assigned) == sorted(job.output for job in objects)
+
+
+def test_shards_ignore_the_build_state_of_the_checkout(project):
+    project.executable(sources(6))
+    config_file = project.parse()
+    builder = Builder(config_file, 1, config_file.default_profile)
+    objects = [job for job in builder.plan() if job.output.suffix == ".o"]
+    before = Shard(builder, ".MakeMake/artifacts").assign(objects, 2)
+
+    # what a finished shard leaves behind in its checkout
+    state = {str(job.output): {"duration": 100.0 if index % 2 == 0 else 0.001} for index, job in enumerate(objects)}
+    builder.state_path.parent.mkdir(parents=True, exist_ok=True)
+    builder.state_path.write_text(json.dumps(state))
+    after = Shard(builder, ".MakeMake/artifacts").assign(objects, 2)
+
+    assert [[job.output for job in shard] for shard in before] == [[job.output for job in shard] for shard in after]
+
+
+def test_shards_use_the_merged_durations(project):
+    project.executable(sources(4))
+    config_file = project.parse()
+    builder = Builder(config_file, 1, config_file.default_profile)
+    objects = [job for job in builder.plan() if job.output.suffix == ".o"]
+    durations = {str(job.output): 1.0 for job in objects}
+    durations[str(objects[0].output)] = 10.0
+    project.write(".MakeMake/artifacts/durations.json", json.dumps(durations))
+
+    shards = Shard(builder, ".MakeMake/artifacts").assign(objects, 2)
+
+    assert [job.output for job in shards[0]] == [objects[0].output]
+
+
+@requires_toolchain
+def test_shards_built_one_after_another_link(project):
+    project.executable(sources(5))
+    project.run("--build", "--shard", "1/2")
+    project.run("--build", "--shard", "2/2")
+    project.run("--build", "--link-shards")
+
+    assert (project.root / "debug" / "app").exists()
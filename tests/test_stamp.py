@@ -0,0 +1,55 @@
+import json
+
+
+def test_unchanged_tree_is_not_generated_again(project):
+    project.executable({"src/main.cpp": "int main() { return 0; }\n"})
+    project.run()
+    makefile = project.root / "Makefile"
+    makefile.write_text(makefile.read_text() + "# kept\n")
+
+    result = project.run()
+
+    assert "nothing to do" in result.stdout
+    assert makefile.read_text().endswith("# kept\n")
+
+
+def test_changed_config_file_is_generated_again(project):
+    project.executable({"src/main.cpp": "int main() { return 0; }\n"})
+    project.run()
+
+    project.executable({"src/main.cpp": "int main() { return 0; }\n"}, globals={"name": "other"})
+    result = project.run()
+
+    assert "nothing to do" not in result.stdout
+
+
+def test_changed_dependency_is_generated_again(project):
+    dependency = project.archive("lib", {"a.cpp": "int a() { return 1; }\n"})
+    project.executable({"src/main.cpp": "int main() { return 0; }\n"}, [dependency])
+    project.run()
+
+    data = json.loads((project.root / dependency).read_text())
+    data["cxx"]["flags"] = ["-O1"]
+    project.config(dependency, data)
+    result = project.run()
+
+    assert "nothing to do" not in result.stdout
+    assert "-O1" in (project.root / "lib" / "Makefile").read_text()
+
+
+def test_stamp_records_only_what_it_checks(project):
+    project.executable({"src/main.cpp": "int main() { return 0; }\n"}, globals={"name": "value"})
+    project.run()
+
+    data = json.loads((project.root / ".MakeMake" / "stamp.json").read_text())
+
+    assert "globals" not in data
+    assert set(data["configs"]) == {"cfg.json"}
+
+
+def test_options_are_part_of_the_stamp(project):
+    project.executable({"src/main.cpp": "int main() { return 0; }\n"})
+    project.run()
+
+    assert "nothing to do" not in project.run("--flat").stdout
+    assert "nothing to do" in project.run("--flat").stdout
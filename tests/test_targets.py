@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from conftest import requires_toolchain
+
+
+SOURCES = {
+    "src/shared.cpp": "int shared() { return 1; }\n",
+    "src/main.cpp": "int shared();\nint main() { return shared() - 1; }\n",
+    "src/tool.cpp": "int shared();\nint main() { return shared() - 1; }\n",
+}
+
+
+def write_project(project, **executable):
+    project.executable(
+        {"src/shared.cpp": SOURCES["src/shared.cpp"]},
+        executable={"name": "app", **executable},
+        targets={"tool": {"name": "tool", "source-files": ["src/tool.cpp"]}},
+    )
+    project.write("src/main.cpp", SOURCES["src/main.cpp"])
+    project.write("src/tool.cpp", SOURCES["src/tool.cpp"])
+
+
+def test_every_target_links_the_shared_objects_and_its_own(project):
+    write_project(project, **{"source-files": ["src/main.cpp"]})
+    config_file = project.parse()
+
+    sources = {target.name: config_file.source_files + config_file.target_source_files(target) for target in config_file.targets}
+
+    assert sources == {"app": ["src/shared.cpp", "src/main.cpp"], "tool": ["src/shared.cpp", "src/tool.cpp"]}
+
+
+@requires_toolchain
+@pytest.mark.parametrize("arguments", [[], ["--flat"]])
+def test_executable_and_targets_link_with_make(project, arguments):
+    write_project(project, **{"source-files": ["src/main.cpp"]})
+    project.run(*arguments)
+    project.make()
+
+    assert (project.root / "debug" / "app").exists()
+    assert (project.root / "debug" / "tool").exists()
+
+
+@requires_toolchain
+def test_executable_and_targets_link_with_the_builder(project):
+    write_project(project, **{"source-files": ["src/main.cpp"]})
+    project.run("--build", "-j", "2")
+
+    assert (project.root / "debug" / "app").exists()
+    assert (project.root / "debug" / "tool").exists()
+
+
+def test_target_source_outside_the_source_directory_is_rejected(project):
+    write_project(project)
+    project.write("tools/extra.cpp", "int extra() { return 0; }\n")
+    data = json.loads((project.root / "cfg.json").read_text())
+    data["targets"]["tool"]["source-files"].append("tools/extra.cpp")
+    project.config("cfg.json", data)
+
+    result = project.run(check=False)
+
+    assert result.returncode != 0
+    assert "`tools/extra.cpp` of target `tool` is not directly in `src/`" in result.stdout + result.stderr
@@ -0,0 +1,55 @@
+from MakeMake import Trace
+from conftest import requires_toolchain
+
+
+def record(target: str, start: float, end: float, prerequisites: list[str]) -> dict:
+    return {"target": target, "start": start, "end": end, "code": 0, "prerequisites": prerequisites}
+
+
+def test_critical_path_follows_the_prerequisites():
+    records = [
+        record("lib/a.o", 0.0, 5.0, ["lib/a.cpp"]),
+        record("main.o", 0.0, 1.0, ["main.cpp"]),
+        # finished last before the link started but the link does not need it
+        record("unrelated.o", 5.0, 5.5, ["unrelated.cpp"]),
+        record("libs/liba.a", 5.0, 5.2, ["lib/a.o"]),
+        record("app", 6.0, 7.0, ["main.o", "libs/liba.a"]),
+    ]
+
+    path = Trace.critical_path(records)
+
+    assert [step["target"] for step in path] == ["lib/a.o", "libs/liba.a", "app"]
+
+
+def test_critical_path_weighs_the_durations():
+    records = [
+        record("slow.o", 0.0, 4.0, []),
+        record("fast.o", 0.0, 1.0, []),
+        record("fast.a", 1.0, 4.5, ["fast.o"]),
+        record("app", 5.0, 6.0, ["slow.o", "fast.a"]),
+    ]
+
+    assert [step["target"] for step in Trace.critical_path(records)] == ["fast.o", "fast.a", "app"]
+
+
+def test_a_prerequisite_that_finished_later_is_not_on_the_path():
+    records = [
+        record("a.o", 0.0, 1.0, []),
+        record("app", 1.0, 2.0, ["a.o", "b.o"]),
+        record("b.o", 3.0, 9.0, []),
+    ]
+
+    assert [step["target"] for step in Trace.critical_path(records)] == ["b.o"]
+
+
+@requires_toolchain
+def test_make_records_the_prerequisites(project):
+    project.executable({"src/main.cpp": "int main() { return 0; }\n"}, [project.archive("lib", {"a.cpp": "int a() { return 1; }\n"})])
+    project.run()
+    project.make("TRACE=1")
+
+    records = {step["target"]: step for step in Trace(project.root / ".MakeMake" / "trace.jsonl").records()}
+    path = [step["target"] for step in Trace.critical_path(list(records.values()))]
+
+    assert {"build/debug/main.cpp.o", "libs/debug/liblib.a"} <= set(records["debug/app"]["prerequisites"])
+    assert path[-1] == "debug/app"